@@ -9,6 +9,7 @@ pyranometers facing up and down
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec 
+import foulum_data
 
 
 start_date =  '2022-12-01 00:00:00' # '2024-03-28 00:00:00'
@@ -19,10 +20,9 @@ time_index = pd.date_range(start=start_date,
                                freq='5min',  
                                tz=tz)
 
-data=pd.read_csv('resources/clean_data.csv',
-                 index_col=0)
-
-data.index = pd.to_datetime(data.index, utc=True) #.tz_convert(tz=tz)
+data = foulum_data.load(columns=['Albedometer (W.m-2)', 'GHI (W.m-2)'],
+                        start=start_date, 
+                        end=end_date)
 
 reflectivity = data['Albedometer (W.m-2)']/data['GHI (W.m-2)']
                      
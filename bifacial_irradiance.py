@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+
+"""
+Calculate front and rear-side irradiance on bifacial PV rows with the
+pvfactors engine, or with the infinite sheds model of pvlib.
+
+pvfactors (backend='pvfactors') raytraces a finite number of rows and is the
+reference for the Foulum installations. The infinite sheds model
+(backend='infinite_sheds') is vectorized and much faster, it is used to
+screen many layouts in yield_sweep.py before confirming the best ones with
+pvfactors. Both return the same columns, see compare_irradiance_backends.py
+for their speed and differences.
+
+Results are stored in 'resources/irradiance_cache/', one parquet file per
+calculation named by a hash of the backend, the geometry (tilt, orientation,
+pvrow height and width, GCR, albedo, number of rows) and the weather inputs
+(time index, DNI, DHI and solar position). Running again the paper figures
+or the annual yield study reads the stored results instead of calculating
+them again.
+
+Irradiance and the SAPM module model are only evaluated for the timestamps
+with the sun above the horizon (apparent zenith < 90 deg), irradiance and
+power are zero at night.
+"""
+
+import hashlib
+import json
+import os
+import warnings
+import numpy as np
+import pandas as pd
+import pvlib
+from pvlib.bifacial import infinite_sheds
+from pvlib.bifacial.pvfactors import pvfactors_timeseries
+# supressing shapely warnings that occur on import of pvfactors
+warnings.filterwarnings(action='ignore', module='pvfactors')
+
+cache_path = 'resources/irradiance_cache/'
+
+# irradiance on the observed PV row returned by pvfactors
+irradiance_columns = ['total_inc_front', 'total_inc_back',
+                      'total_abs_front', 'total_abs_back']
+
+# fraction of the incident irradiance reflected by the front and back side
+# of the PV rows (default values of pvfactors)
+rho_front_pvrow = 0.03
+rho_back_pvrow = 0.05
+
+
+def calculate_irradiance_bifacial(tilt,
+                                  orientation,
+                                  bifaciality,
+                                  time_index,
+                                  dni,
+                                  dhi,
+                                  solar_azimuth,
+                                  solar_zenith,
+                                  pvrow_height,
+                                  pvrow_width,
+                                  albedo,
+                                  gcr,
+                                  n_pvrows=4,
+                                  index_observed_pvrow=1,
+                                  backend='pvfactors',
+                                  cache_path=cache_path):
+    """
+    Calculate irradiance and effective irradiance on both planes of array (POA)
+    using measured weather data or TMY and the pvfactors engine (or the
+    infinite sheds model if backend='infinite_sheds') for both front and
+    rear-side effective irradiance
+    """
+
+    irrad = row_irradiance(tilt,
+                           orientation,
+                           time_index,
+                           dni,
+                           dhi,
+                           solar_azimuth,
+                           solar_zenith,
+                           pvrow_height,
+                           pvrow_width,
+                           albedo,
+                           gcr,
+                           n_pvrows=n_pvrows,
+                           index_observed_pvrow=index_observed_pvrow,
+                           backend=backend,
+                           cache_path=cache_path)
+
+    # using bifaciality factor and pvfactors results, create effective irradiance
+    effective_irrad_bifi = irrad['total_abs_front'] + (irrad['total_abs_back']
+                                                       * bifaciality)
+    return effective_irrad_bifi
+
+
+
+def row_irradiance(tilt,
+                   orientation,
+                   time_index,
+                   dni,
+                   dhi,
+                   solar_azimuth,
+                   solar_zenith,
+                   pvrow_height,
+                   pvrow_width,
+                   albedo,
+                   gcr,
+                   n_pvrows=4,
+                   index_observed_pvrow=1,
+                   backend='pvfactors',
+                   cache_path=cache_path):
+    """
+    Return the incident and absorbed irradiance on the front and back side
+    of the observed PV row calculated by backend ('pvfactors' or
+    'infinite_sheds'), read from cache_path if it was calculated before with
+    the same backend, geometry and weather inputs (cache_path=None disables
+    the cache)
+    """
+
+    if cache_path is not None:
+        geometry = {'backend': backend,
+                    'tilt': tilt,
+                    'orientation': orientation,
+                    'pvrow_height': pvrow_height,
+                    'pvrow_width': pvrow_width,
+                    'gcr': gcr,
+                    'albedo': albedo,
+                    'n_pvrows': n_pvrows,
+                    'index_observed_pvrow': index_observed_pvrow}
+        weather = {'dni': dni,
+                   'dhi': dhi,
+                   'solar_azimuth': solar_azimuth,
+                   'solar_zenith': solar_zenith}
+        fn = os.path.join(cache_path,
+                          calculation_key(time_index, geometry, weather) + '.parquet')
+        if os.path.exists(fn):
+            return pd.read_parquet(fn)
+
+    # irradiance is only calculated for the timestamps with the sun above
+    # the horizon, it is zero at night
+    daytime = np.asarray(solar_zenith) < 90
+    irrad = pd.DataFrame(0.0, index=pd.DatetimeIndex(time_index), columns=irradiance_columns)
+    if daytime.any():
+        daytime_irrad = backends[backend](tilt,
+                                          orientation,
+                                          time_index[daytime],
+                                          _daytime(dni, daytime),
+                                          _daytime(dhi, daytime),
+                                          _daytime(solar_azimuth, daytime),
+                                          _daytime(solar_zenith, daytime),
+                                          pvrow_height,
+                                          pvrow_width,
+                                          _daytime(albedo, daytime),
+                                          gcr,
+                                          n_pvrows,
+                                          index_observed_pvrow)
+        irrad.loc[daytime, irradiance_columns] = daytime_irrad[irradiance_columns].to_numpy()
+
+    if cache_path is not None:
+        os.makedirs(cache_path, exist_ok=True)
+        # write to a temporary file first, so parallel calculations never
+        # read an incomplete file
+        irrad.to_parquet(fn + '.{}.tmp'.format(os.getpid()))
+        os.replace(fn + '.{}.tmp'.format(os.getpid()), fn)
+    return irrad
+
+
+
+def pvfactors_irradiance(tilt,
+                         orientation,
+                         time_index,
+                         dni,
+                         dhi,
+                         solar_azimuth,
+                         solar_zenith,
+                         pvrow_height,
+                         pvrow_width,
+                         albedo,
+                         gcr,
+                         n_pvrows=4,
+                         index_observed_pvrow=1):
+    """
+    Irradiance on the observed row of n_pvrows calculated with the view
+    factors of pvfactors
+    """
+
+    surface_azimuth = orientation
+    surface_tilt = tilt
+    axis_azimuth = orientation+90
+    # axis_azimuth (float) – Azimuth angle of the rotation axis of the PV modules,
+    # using pvlib’s convention (deg). This is supposed to be fixed for all timestamps.
+    # When modeling fixed-tilt arrays, set this value to be 90 degrees clockwise
+    # from surface_azimuth.
+
+    irrad = pvfactors_timeseries(solar_azimuth,
+                                 solar_zenith,
+                                 surface_azimuth,
+                                 surface_tilt,
+                                 axis_azimuth,
+                                 time_index,
+                                 dni,
+                                 dhi,
+                                 gcr,
+                                 pvrow_height,
+                                 pvrow_width,
+                                 albedo,
+                                 n_pvrows=n_pvrows,
+                                 index_observed_pvrow=index_observed_pvrow,
+                                 rho_front_pvrow=rho_front_pvrow,
+                                 rho_back_pvrow=rho_back_pvrow)
+
+    # turn into pandas DataFrame
+    return pd.concat(irrad, axis=1)
+
+
+
+def infinite_sheds_irradiance(tilt,
+                              orientation,
+                              time_index,
+                              dni,
+                              dhi,
+                              solar_azimuth,
+                              solar_zenith,
+                              pvrow_height,
+                              pvrow_width,
+                              albedo,
+                              gcr,
+                              n_pvrows=4,
+                              index_observed_pvrow=1):
+    """
+    Irradiance on a row of an infinite array calculated with the vectorized
+    infinite sheds model of pvlib (n_pvrows and index_observed_pvrow are not
+    used). The absorbed irradiance uses the same reflection losses as
+    pvfactors.
+    """
+
+    dni = pd.Series(np.asarray(dni, dtype=float), index=time_index)
+    dhi = pd.Series(np.asarray(dhi, dtype=float), index=time_index)
+    ghi = dhi + dni*np.cos(np.radians(np.asarray(solar_zenith, dtype=float)))
+    irrad = infinite_sheds.get_irradiance(tilt,
+                                          orientation,
+                                          solar_zenith,
+                                          solar_azimuth,
+                                          gcr,
+                                          pvrow_height,
+                                          pvrow_width/gcr,
+                                          ghi,
+                                          dhi,
+                                          dni,
+                                          albedo)
+    return pd.DataFrame({'total_inc_front': irrad['poa_front'],
+                         'total_inc_back': irrad['poa_back'],
+                         'total_abs_front': (1 - rho_front_pvrow)*irrad['poa_front'],
+                         'total_abs_back': (1 - rho_back_pvrow)*irrad['poa_back']},
+                        index=time_index)
+
+
+
+# irradiance models, same inputs and output columns
+backends = {'pvfactors': pvfactors_irradiance,
+            'infinite_sheds': infinite_sheds_irradiance}
+
+
+
+def sapm_daytime(effective_irradiance, cell_temperature, module, solar_zenith):
+
+    """
+    Return pvlib.pvsystem.sapm() calculated for the timestamps with the sun
+    above the horizon, with zeros at night
+    """
+
+    daytime = np.asarray(solar_zenith) < 90
+    dc_power = pvlib.pvsystem.sapm(effective_irradiance[daytime],
+                                   cell_temperature[daytime],
+                                   module)
+    return dc_power.reindex(effective_irradiance.index, fill_value=0)
+
+
+
+def calculation_key(time_index, geometry, weather):
+
+    """
+    Return a hash of the time index, the geometry parameters (dictionary of
+    numbers) and the weather inputs (dictionary of arrays, or numbers, with
+    one value per timestamp)
+    """
+
+    h = hashlib.sha256()
+    h.update(json.dumps({k: v for k, v in geometry.items() if np.ndim(v) == 0},
+                        sort_keys=True, default=float).encode())
+    # albedo may also be given for every timestamp
+    weather = dict(weather, **{k: v for k, v in geometry.items() if np.ndim(v) > 0})
+    columns = {k: np.broadcast_to(np.asarray(v, dtype=float), len(time_index))
+               for k, v in sorted(weather.items())}
+    h.update(json.dumps(list(columns)).encode())
+    frame = pd.DataFrame(columns, index=pd.DatetimeIndex(time_index))
+    h.update(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+
+def _daytime(values, daytime):
+
+    """
+    Return the values (array-like, or a number for all timestamps) of the
+    timestamps in the boolean mask daytime
+    """
+
+    if np.ndim(values) == 0:
+        return values
+    return np.asarray(values)[daytime]
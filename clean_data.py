@@ -6,17 +6,167 @@ inverters datalogger, creates a data file named 'clean_data.csv' and
 stores it in the folder 'resources'.
 """
 
+import argparse
+import csv
+import io
 import pandas as pd
 import numpy as np
-import datetime
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import seaborn as sns
 import matplotlib.pyplot as plt
+import foulum_data
+import corrections
 
-def retrieve_inverter(data_path, clean_dataframe, start_date, end_date, tz): 
+# columns of the "5 minutes" sheet in the inverter datafiles that are used
+inverter_columns = (['ManageObject', 'Inverter status', 
+                     'Total input power(kW)', 'Active power(kW)'] 
+                    + ['PV{} input {}'.format(i, q) for i in range(1, 9) 
+                       for q in ['current(A)', 'voltage(V)']])
+
+
+def file_signature(fn): 
+
+    """
+    Return path, size, modification time and content hash of a raw datafile
+    """
+
+    sha256 = hashlib.sha256()
+    with open(fn, 'rb') as f:
+        for chunk in iter(lambda: f.read(2**20), b''):
+            sha256.update(chunk)
+    stat = os.stat(fn)
+    return {'path': os.path.abspath(fn),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'sha256': sha256.hexdigest()}
+
+
+
+def read_inverter_file(fn, cache_path): 
+
+    """
+    Read the "5 minutes" sheet of a monthly inverter datafile. 
+    
+    Parsing the xlsx files with openpyxl is slow, so the parsed sheet is 
+    stored in cache_path as a parquet file together with the signature of 
+    the datafile (path, size, mtime and sha256). The cached copy is reused 
+    as long as the datafile has not changed.
+    """
+
+    name = os.path.splitext(os.path.basename(fn))[0]
+    fn_cache = os.path.join(cache_path, name + '.parquet')
+    fn_signature = os.path.join(cache_path, name + '.json')
+
+    stat = os.stat(fn)
+    if os.path.exists(fn_cache) and os.path.exists(fn_signature):
+        with open(fn_signature) as f:
+            signature = json.load(f)
+        # mtime is checked first to avoid hashing unchanged files, if only 
+        # the mtime changed (e.g. file copied) the content hash decides 
+        if (signature['path'] == os.path.abspath(fn) 
+            and signature['size'] == stat.st_size):
+            if signature['mtime'] == stat.st_mtime:
+                return pd.read_parquet(fn_cache)
+            current = file_signature(fn)
+            if signature['sha256'] == current['sha256']:
+                # store the new mtime, so the file is not hashed again
+                with open(fn_signature, 'w') as f:
+                    json.dump(current, f)
+                return pd.read_parquet(fn_cache)
+
+    print('parsing ' + fn)
+    input_data = pd.read_excel(fn,
+                               sheet_name="5 minutes", 
+                               index_col=3, 
+                               header=0, 
+                               skiprows=3,
+                               engine='openpyxl')
+    input_data = input_data[[c for c in inverter_columns 
+                             if c in input_data.columns]]
+    for c in input_data.columns[2:]:
+        input_data[c] = pd.to_numeric(input_data[c], errors='coerce')
+
+    os.makedirs(cache_path, exist_ok=True)
+    input_data.to_parquet(fn_cache)
+    with open(fn_signature, 'w') as f:
+        json.dump(file_signature(fn), f)
+    return input_data
+
+
+
+# clean_data columns and the (inverter, datafile column) they are read from
+inv1 = 'Logger-1/INV-1-TBF' #inverter 1 (tilted bifacial)
+inv2 = 'Logger-1/INV-2-VBF' #inverter 2 (vertical bifacial)
+inverter_mapping_2023 = {
+    'TBF inverter status': (inv1, 'Inverter status'),
+    'VBF inverter status': (inv2, 'Inverter status'),
+    'INV-1-TBF Total input power (kW)': (inv1, 'Total input power(kW)'),
+    'INV-2-VBF Total input power (kW)': (inv2, 'Total input power(kW)'),
+    'INV-1-TBF Active power (kW)': (inv1, 'Active power(kW)'),
+    'INV-2-VBF Active power (kW)': (inv2, 'Active power(kW)'),
+    'VBF PV1 input current (A)': (inv2, 'PV1 input current(A)'),
+    'VBF PV2 input current (A)': (inv2, 'PV2 input current(A)'),
+    'VBF PV3 input current (A)': (inv2, 'PV3 input current(A)'),
+    'VBF PV4 input current (A)': (inv2, 'PV4 input current(A)'),
+    'VBF PV1 input voltage (V)': (inv2, 'PV1 input voltage(V)'),
+    'VBF PV2 input voltage (V)': (inv2, 'PV2 input voltage(V)'),
+    'VBF PV3 input voltage (V)': (inv2, 'PV3 input voltage(V)'),
+    'VBF PV4 input voltage (V)': (inv2, 'PV4 input voltage(V)'),
+    'TBF PV1 input current (A)': (inv1, 'PV1 input current(A)'),
+    'TBF PV3 input current (A)': (inv1, 'PV3 input current(A)'),
+    'TBF PV1 input voltage (V)': (inv1, 'PV1 input voltage(V)'),
+    'TBF PV3 input voltage (V)': (inv1, 'PV3 input voltage(V)'),
+    'TBF PV2 input current (A)': (inv1, 'PV2 input current(A)'),
+    'TBF PV4 input current (A)': (inv1, 'PV4 input current(A)'),
+    'TBF PV2 input voltage (V)': (inv1, 'PV2 input voltage(V)'),
+    'TBF PV4 input voltage (V)': (inv1, 'PV4 input voltage(V)')}
+
+# strings 2 and 4 connection to inverter 1 (tilted bifacial) was changed on 
+# 07/09/2024, they are reported as PV5 and PV7 from the October 2024 datafile
+# onwards. Each mapping applies to the monthly datafiles from its date on.
+inverter_mapping = {
+    '2022-12-01': inverter_mapping_2023,
+    '2024-10-01': dict(inverter_mapping_2023, 
+                       **{'TBF PV2 input current (A)': (inv1, 'PV5 input current(A)'),
+                          'TBF PV4 input current (A)': (inv1, 'PV7 input current(A)'),
+                          'TBF PV2 input voltage (V)': (inv1, 'PV5 input voltage(V)'),
+                          'TBF PV4 input voltage (V)': (inv1, 'PV7 input voltage(V)')})}
+
+
+
+def pivot_inverter(input_data, mapping):
+
+    """
+    Pivot the rows of both inverters in a datafile into a single block with
+    one row per timestamp and the clean_data columns defined in mapping
+    """
+
+    blocks = []
+    for inverter in dict.fromkeys(i for i, _ in mapping.values()):
+        keys = [k for k, (i, _) in mapping.items() if i == inverter]
+        inv = input_data[input_data['ManageObject'] == inverter]
+        inv = inv.reindex(columns=[mapping[k][1] for k in keys])
+        inv.columns = keys
+        blocks.append(inv[~inv.index.duplicated(keep='last')])
+
+    return pd.concat(blocks, axis=1)[list(mapping)]
+
+
+
+def retrieve_inverter(data_path, clean_dataframe, start_date, end_date, tz,
+                      cache_path='resources/inverter_cache/', workers=1): 
 
     """
     Retrieve inverters data (collected trough solar fussion)
 
+    Parsed datafiles are cached in cache_path, only new or modified monthly
+    datafiles are parsed again, in a pool of processes if workers > 1. Every 
+    month is pivoted into a block with the clean_data columns and all the 
+    blocks are joined to clean_data at once.
     """
 
     #index to read the datafiles, one datafile per month, 
@@ -25,123 +175,199 @@ def retrieve_inverter(data_path, clean_dataframe, start_date, end_date, tz):
                                      freq='M',  
                                      tz=tz)
     
-    for m in time_index_month:
-    
-        fn='Inverter_{}_{}.xlsx'.format(m.year, str(m.month).zfill(2))
-        print('retrieving ' + fn)
-        input_data = pd.read_excel((data_path + fn),
-                                   sheet_name="5 minutes", 
-                                   index_col=3, 
-                                   header=0, 
-                                   skiprows=3,
-                                   engine='openpyxl').squeeze("columns")
+    fns = [data_path + 'Inverter_{}_{}.xlsx'.format(m.year, str(m.month).zfill(2))
+           for m in time_index_month]
+    print('retrieving {} inverter datafiles'.format(len(fns)))
+
+    # datafiles are independent, parse them in parallel if workers > 1, 
+    # map returns the results in month order 
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            input_datas = list(executor.map(read_inverter_file, fns, 
+                                            repeat(cache_path)))
+    else:
+        input_datas = map(read_inverter_file, fns, repeat(cache_path))
+
+    blocks = []
+    for m, input_data in zip(time_index_month, input_datas):
     
         input_data.index = pd.to_datetime(input_data.index).tz_localize(tz=tz)
 
-        #identify data for inverter 1 (tilted bifacial) and 2 (vertical bifacial)
-        inv1=input_data[input_data['ManageObject']=='Logger-1/INV-1-TBF']
-        inv2=input_data[input_data['ManageObject']=='Logger-1/INV-2-VBF']
-        
-        clean_data.loc[inv1.index,['TBF inverter status']] = inv1['Inverter status']
-        clean_data.loc[inv2.index,['VBF inverter status']] = inv2['Inverter status']
-
-        clean_data.loc[inv1.index,['INV-1-TBF Total input power (kW)']] = inv1['Total input power(kW)']
-        clean_data.loc[inv2.index,['INV-2-VBF Total input power (kW)']] = inv2['Total input power(kW)']
-        clean_data.loc[inv1.index,['INV-1-TBF Active power (kW)']] = inv1['Active power(kW)']
-        clean_data.loc[inv2.index,['INV-2-VBF Active power (kW)']] = inv2['Active power(kW)']
-        
-        clean_data.loc[inv2.index,['VBF PV1 input current (A)']] = inv2['PV1 input current(A)']
-        clean_data.loc[inv2.index,['VBF PV2 input current (A)']] = inv2['PV2 input current(A)']
-        clean_data.loc[inv2.index,['VBF PV3 input current (A)']] = inv2['PV3 input current(A)']
-        clean_data.loc[inv2.index,['VBF PV4 input current (A)']] = inv2['PV4 input current(A)']  
-        
-        clean_data.loc[inv2.index,['VBF PV1 input voltage (V)']] = inv2['PV1 input voltage(V)']
-        clean_data.loc[inv2.index,['VBF PV2 input voltage (V)']] = inv2['PV2 input voltage(V)']
-        clean_data.loc[inv2.index,['VBF PV3 input voltage (V)']] = inv2['PV3 input voltage(V)']
-        clean_data.loc[inv2.index,['VBF PV4 input voltage (V)']] = inv2['PV4 input voltage(V)']
-
-        clean_data.loc[inv1.index,['TBF PV1 input current (A)']] = inv1['PV1 input current(A)']
-        clean_data.loc[inv1.index,['TBF PV3 input current (A)']] = inv1['PV3 input current(A)']
-        clean_data.loc[inv1.index,['TBF PV1 input voltage (V)']] = inv1['PV1 input voltage(V)']      
-        clean_data.loc[inv1.index,['TBF PV3 input voltage (V)']] = inv1['PV3 input voltage(V)']
-  
-        # string X and X connection to inverter 1 (tilted bifacial) was changed on 07/09/2024
-        
-        if m < pd.to_datetime('2024-09-30 00:00:00+00:00'):
-            clean_data.loc[inv1.index,['TBF PV2 input current (A)']] = inv1['PV2 input current(A)']
-            clean_data.loc[inv1.index,['TBF PV4 input current (A)']] = inv1['PV4 input current(A)']
-            clean_data.loc[inv1.index,['TBF PV2 input voltage (V)']] = inv1['PV2 input voltage(V)']
-            clean_data.loc[inv1.index,['TBF PV4 input voltage (V)']] = inv1['PV4 input voltage(V)']  
-        
-        else:            
-            clean_data.loc[inv1.index,['TBF PV2 input current (A)']] = inv1['PV5 input current(A)']
-            clean_data.loc[inv1.index,['TBF PV4 input current (A)']] = inv1['PV7 input current(A)']
-            clean_data.loc[inv1.index,['TBF PV2 input voltage (V)']] = inv1['PV5 input voltage(V)']
-            clean_data.loc[inv1.index,['TBF PV4 input voltage (V)']] = inv1['PV7 input voltage(V)']  
-        
+        mapping = [v for k, v in sorted(inverter_mapping.items()) 
+                   if pd.Timestamp(k, tz=tz) <= m][-1]
+        blocks.append(pivot_inverter(input_data, mapping))
 
-    
-    clean_data.to_csv('resources/clean_data.csv')
-    return clean_data
+    inverter_data = pd.concat(blocks)
+    inverter_data = inverter_data[~inverter_data.index.duplicated(keep='last')]
+    clean_dataframe = clean_dataframe.drop(columns=inverter_data.columns, 
+                                           errors='ignore').join(inverter_data)
+    return clean_dataframe
 
    
 
    
 
-def retrieve_weather_station(fn, clean_dataframe, dic_columns, start_date, end_date, tz):  
+def read_toa5(fn, columns, dtype='float64', offset=0):
+
+    """
+    Read columns of a Campbell Scientific datalogger file in TOA5 format.
+
+    The four header lines (file information, variable names, units and 
+    processing) are parsed once to locate the requested columns, given as 
+    (name, unit, processing) tuples. Empty header fields are named 
+    'Unnamed: <column>_level_<line>' as in pandas MultiIndex headers. Only 
+    those columns are read, with a fixed dtype and timestamp format. 
+
+    Rows are read from byte offset (or after the header) up to the last 
+    complete line. Returns the data and the byte offset after that line.
+    """
+
+    with open(fn, 'rb') as f:
+        lines = [f.readline() for i in range(4)]
+        f.seek(max(offset, f.tell()))
+        start = f.tell()
+        body = f.read()
+    # a row that is still being written by the datalogger is left for later
+    body = body[:body.rfind(b'\n') + 1]
+
+    header = list(csv.reader([l.decode('utf-8') for l in lines]))[1:]
+    keys = [tuple(h[i] if h[i] != '' else 'Unnamed: {}_level_{}'.format(i, l)
+                  for l, h in enumerate(header)) 
+            for i in range(len(header[0]))]
+    positions = [keys.index(tuple(c)) for c in columns]
+
+    if len(body) == 0:
+        data = pd.DataFrame({p: pd.Series(dtype=dtype) for p in positions},
+                            index=pd.Index([], dtype=str))
+    else:
+        data = pd.read_csv(io.BytesIO(body), 
+                           header=None,
+                           usecols=[0] + positions,
+                           index_col=0,
+                           na_values=['NAN'],
+                           dtype={p: dtype for p in positions},
+                           engine='c')
+    data = data[positions]
+    data.columns = pd.Index([keys[p] for p in positions], tupleize_cols=False)
+    data.index = pd.to_datetime(data.index, format='%Y-%m-%d %H:%M:%S')
+    data.index.name = 'TIMESTAMP'
+    return data, start + len(body)
+
+
+
+def read_weather_station_file(fn, columns, cache_path): 
+
+    """
+    Read columns of a weather station datafile, parsing only the rows that 
+    were appended since the previous call.
+
+    The datafiles are append-only logs. The parsed rows are stored in 
+    cache_path as a parquet file, together with the byte offset and the 
+    raw bytes of the last row read. If the requested columns changed or the 
+    last row read is not found before the offset anymore (the file was 
+    replaced), the file is parsed from the start.
+
+    Rows dumped again by the logger are kept, retrieve_weather_station() 
+    keeps the last value of duplicated timestamps.
+    """
+
+    name = os.path.splitext(os.path.basename(fn))[0]
+    fn_cache = os.path.join(cache_path, name + '.parquet')
+    fn_state = os.path.join(cache_path, name + '.json')
+    columns = [list(c) for c in columns]
+
+    cached, offset = None, 0
+    if os.path.exists(fn_cache) and os.path.exists(fn_state):
+        with open(fn_state) as f:
+            state = json.load(f)
+        if (state['path'] == os.path.abspath(fn) and state['columns'] == columns
+            and os.path.getsize(fn) >= state['offset']):
+            # the last row is stored as latin-1, which maps every byte to 
+            # one character, so its length is its length in bytes (rows of 
+            # older caches that are not latin-1 do not match, and the file 
+            # is parsed again)
+            expected_row = state['last_row'].encode('latin-1', errors='replace')
+            with open(fn, 'rb') as f:
+                f.seek(max(state['offset'] - len(expected_row), 0))
+                last_row = f.read(len(expected_row))
+            if last_row == expected_row:
+                cached = pd.read_parquet(fn_cache)
+                cached.columns = pd.Index([tuple(c) for c in columns], 
+                                          tupleize_cols=False)
+                offset = state['offset']
+
+    new, offset = read_toa5(fn, columns, offset=offset)
+    print('{}: {} new rows'.format(fn, len(new)))
+    data = new if cached is None else pd.concat([cached, new])
+
+    if cached is None or len(new) > 0:
+        with open(fn, 'rb') as f:
+            f.seek(max(offset - 1024, 0))
+            last_row = f.read(offset - f.tell()).splitlines(keepends=True)[-1]
+        os.makedirs(cache_path, exist_ok=True)
+        data.set_axis([str(i) for i in range(len(columns))], axis=1).to_parquet(fn_cache)
+        with open(fn_state, 'w') as f:
+            json.dump({'path': os.path.abspath(fn),
+                       'columns': columns,
+                       'offset': offset,
+                       'last_row': last_row.decode('latin-1')}, f)
+    return data
+
+
+
+def retrieve_weather_station(fn, clean_dataframe, dic_columns, start_date, end_date, tz,
+                             cache_path='resources/weather_station_cache/'):  
 
     """
     Retrieve weather station data
+
+    Rows parsed in previous runs are kept in cache_path, only the rows 
+    appended to the datafile since then are parsed.
     """  
     time_index = pd.date_range(start=start_date, 
                                end=end_date, 
                                freq='5min',  
                                tz=tz)
-    data = pd.read_csv(fn, 
-                       skiprows=1,
-                       header=[0,1,2],
-                       sep=',',
-                       index_col=0, 
-                       low_memory=False) 
+    data = read_weather_station_file(fn, list(dic_columns.values()), cache_path)
 
-    data.index = pd.to_datetime(data.index).tz_localize(tz=tz, 
-                                                        ambiguous='NaT', #'infer',
-                                                        nonexistent='shift_forward')
-
-    # merge indices into a single index and convert values to float
-    data.columns = data.columns.to_flat_index()
-    data=data.astype(float)
+    data.index = data.index.tz_localize(tz=tz, 
+                                        ambiguous='NaT', #'infer',
+                                        nonexistent='shift_forward')
 
     # remove duplicated values to enable reindex
-    #data = data[~data.index.duplicated()]
-    data.drop_duplicates(keep='last', inplace=True)
+    data = data[~data.index.duplicated(keep='last')]
     
     for key, value in dic_columns.items():
-        clean_data.loc[time_index,key] = data[value].reindex(time_index, fill_value=np.nan) 
+        clean_dataframe.loc[time_index,key] = data[value].reindex(time_index, fill_value=np.nan) 
         
-    clean_data.to_csv('resources/clean_data.csv')
-    return clean_data
+    return clean_dataframe
 
 
 
-def retrieve_weather_station6069(fn, clean_dataframe, dic_columns, start_date, end_date, tz):  
+def retrieve_weather_station6069(fns, clean_dataframe, dic_columns, start_date, end_date, tz):  
 
     """
     Read data from 2nd weather station 6069 (Jeroen's)
+
+    fns can be a single export or a list of exports, if a timestamp is in 
+    several exports the value from the last one in the list is used.
     """
     
-    data = pd.read_csv(fn, 
-                       sep=',',
-                       low_memory=False)
-
-    data['index'] =[datetime.datetime.strptime(x+' '+str(y).zfill(2)+':00:00',"%d/%m/%Y %H:%M:%S") 
-                    for x,y in zip(data['date'],data['time'])]
-    data.set_index(data['index'], drop=True, inplace=True)
-
-
-    data.index = pd.to_datetime(data.index).tz_localize(tz=tz, 
-                                                        ambiguous='NaT', #'infer',
-                                                        nonexistent='shift_forward')
+    if isinstance(fns, str):
+        fns = [fns]
+    data = pd.concat([pd.read_csv(fn, 
+                                  sep=',',
+                                  usecols=['date', 'time'] + list(dic_columns.values()))
+                      for fn in fns])
+
+    # date (dd/mm/yyyy) and hour (0-23) are given in two columns
+    data.index = (pd.to_datetime(data['date'], format='%d/%m/%Y') 
+                  + pd.to_timedelta(data['time'], unit='h'))
+    data = data[~data.index.duplicated(keep='last')].sort_index()
+
+    data.index = data.index.tz_localize(tz=tz, 
+                                        ambiguous='NaT', #'infer',
+                                        nonexistent='shift_forward')
     
     #index to read hourly values from second weather station
     time_index_hour = pd.date_range(start=start_date, 
@@ -150,177 +376,263 @@ def retrieve_weather_station6069(fn, clean_dataframe, dic_columns, start_date, e
                                     tz=tz)
     
     for key, value in dic_columns.items():        
-        clean_data.loc[time_index_hour,key] = data[value].reindex(time_index_hour) 
+        clean_dataframe.loc[time_index_hour,key] = data[value].reindex(time_index_hour) 
 
-    clean_data.to_csv('resources/clean_data.csv')
-    return clean_data
+    return clean_dataframe
 
 
 
-# Create empty dataframe to be populated
+# period covered by clean_data, dateindex in UTC
 tz = 'UTC' 
 start_date = '2022-12-01 00:00:00'
 end_date = '2026-04-12 23:55:00'
-time_index = pd.date_range(start=start_date, 
-                               end=end_date, 
-                               freq='5min',  
-                               tz=tz)
 
-clean_data=pd.DataFrame(index=time_index)   
-
-time_index_hour = pd.date_range(start=start_date, 
-                                end=end_date, 
-                                freq='H',  
-                                tz=tz)
-
-#retrieve data from inverters, dateindex in CET/CEST (indicated by DST)
-data_path='data/inverter_monthly_datafiles/'
-clean_data = retrieve_inverter(data_path, 
-                               clean_data, 
-                               start_date = '2023-04-01 00:00:00', #'2024-02-01 00:00:00'
-                               end_date = end_date, 
-                               tz='CET')
-
-#retrieve data from weather station, dataindex in UTC
-fn = 'data/weather_station_data/CR1000XSeries_2_Table2.dat'
-dic_columns = {'GHI_SPN1 (W.m-2)':('Global_Avg', 'W.m-2', 'Avg'),
-               'DHI_SPN1 (W.m-2)':('Diffuse_Avg', 'W.m-2', 'Avg'),
-               'GHI (W.m-2)':('Solar_Wm2_2_Avg', 'W/m²', 'Avg'),
-               'Albedometer (W.m-2)':('Solar_Wm2_1_Avg', 'W/m²', 'Avg'),
-               'PAR (umol.s-1.m-2)':('PAR_Den_Avg', 'umol/s/m^2', 'Avg'),
-               'Ambient Temperature (Deg C)':('AirTC_Avg', 'Deg C', 'Avg'),
-               'Relative Humidity (%)':('RH', '%', 'Smp'),
-               'Reference Cell Tilted facing up (W.m-2)':('CS325DM_Analog1_1_Avg', 'W/m²', 'Avg'),
-               'Reference Cell Tilted facing down (W.m-2)':('CS325DM_Analog1_2_Avg', 'W/m²', 'Avg'),
-               'Reference Cell Vertical East (W.m-2)':('CS325DM_Analog1_3_Avg', 'W/m²', 'Avg'),
-               'Reference Cell Vertical West (W.m-2)':('CS325DM_Analog1_4_Avg', 'W/m²', 'Avg')} 
-
-clean_data = retrieve_weather_station(fn, 
-                                      clean_data, 
-                                      dic_columns, 
-                                      start_date, 
-                                      end_date, 
-                                      tz='UTC') 
-
-# #Data from weather station from 2023/04/18 to 2023/08/25 
-fn = 'data/weather_station_data/CR1000XSeries_Table2_old.dat'
-clean_data = retrieve_weather_station(fn, 
-                                      clean_data, 
-                                      dic_columns, 
-                                      start_date = '2023-04-18 00:00:00', 
-                                      end_date = '2023-08-25 23:55:00', 
-                                      tz = 'UTC') 
-
-
-# reference cell facing up were not properly working (broken wires)
-# from 18/05/2023 to 19/05/2023 and from 15/06/2023 to 06/09/2023 
-time_index_tbc = pd.date_range(start='2023-05-18 00:00:00', 
-                                end='2023-05-19 00:00:00', 
-                                freq='5min',  
-                                tz=tz)
-clean_data['Reference Cell Tilted facing up (W.m-2)'][time_index_tbc]=np.nan
-time_index_tbc = pd.date_range(start='2023-06-15 00:00:00', 
-                                end='2023-09-06 00:00:00', 
-                                freq='5min',  
-                                tz=tz)
-clean_data['Reference Cell Tilted facing up (W.m-2)'][time_index_tbc]=np.nan
-
-# reference cell in vertical setup were not properly working (broken wire)
-# from 14/08/2023 to 07/09/2023 
-time_index_tbc = pd.date_range(start='2023-08-14 00:00:00', 
-                                end='2023-09-07 00:00:00', 
-                                freq='5min',  
-                                tz=tz)
-clean_data['Reference Cell Vertical East (W.m-2)'][time_index_tbc]=np.nan
-clean_data['Reference Cell Vertical West (W.m-2)'][time_index_tbc]=np.nan
-
-
-# when vertical reference cells were connected on 2023/09/07 the input
-# were swapt between vertical and tilted
-time_index_tbc = pd.date_range(start='2023-09-07 00:00:00', 
-                                end=end_date, 
-                                freq='5min',  
-                                tz=tz)
-save_a = clean_data['Reference Cell Tilted facing up (W.m-2)'][time_index_tbc].copy()
-save_b = clean_data['Reference Cell Tilted facing down (W.m-2)'][time_index_tbc].copy()
-clean_data['Reference Cell Tilted facing up (W.m-2)'][time_index_tbc] = clean_data['Reference Cell Vertical East (W.m-2)'][time_index_tbc]
-clean_data['Reference Cell Tilted facing down (W.m-2)'][time_index_tbc] = clean_data['Reference Cell Vertical West (W.m-2)'][time_index_tbc]
-clean_data['Reference Cell Vertical East (W.m-2)'][time_index_tbc] = save_a[time_index_tbc]
-clean_data['Reference Cell Vertical West (W.m-2)'][time_index_tbc] = save_b[time_index_tbc]
-
-#Add 2-hour shift to weather station data from 14/07/2023 
-time_index_tbc = pd.date_range(start ='2023-07-04 00:00:00', 
-                                end = end_date[:-8]+'21:55:00',
-                                freq ='5min',  
-                                tz = tz)
-
-clean_data.loc[time_index_tbc,[i for i in dic_columns.keys()]] = clean_data.loc[time_index_tbc + pd.DateOffset(hours=2),[i for i in dic_columns.keys()]].values
-
-
-
-#correct measuring errors in temperature sensor and relative humidity sensor
-clean_data['Ambient Temperature (Deg C)'][clean_data['Ambient Temperature (Deg C)']<-80.0]=None
-clean_data['Relative Humidity (%)'][clean_data['Relative Humidity (%)']==-100.0]=None
-
-
-#Retrieve weather station data - wind sensor
-fn = 'data/weather_station_data/CR1000XSeries_2_Table1.dat'
-dic_columns = {'wind velocity (m.s-1)':('WS_ms_S_WVT', 'meters/second', 'WVc'),
-               'wind direction (deg)':('WindDir_D1_WVT', 'Deg', 'WVc'),
-               'wind gust (m.s-1)': ('Gust3s_Max', 'Unnamed: 4_level_1', 'Max')}
-
-clean_data = retrieve_weather_station(fn, 
-                                      clean_data, 
-                                      dic_columns, 
-                                      start_date, 
-                                      end_date, 
-                                      tz='UTC')  
-
-#Retrieve weather station data - wind sensor from 2023/04/18 to 2023/08/25 
-fn = 'data/weather_station_data/CR1000XSeries_Table1_old.dat'
-clean_data = retrieve_weather_station(fn, 
-                                      clean_data, 
-                                      dic_columns, 
-                                      start_date = '2023-04-18 00:00:00', 
-                                      end_date = '2023-08-25 23:55:00', 
-                                      tz = 'UTC') 
-
-# Before 06/09/2023 the wind sensor was incorrectly monted, on that date,
-# it was rotated 180 degrees
-time_index_tbc = pd.date_range(start='2022-12-01 00:00:00',
-                                end='2023-09-07 00:00:00',
-                                freq='5min',  
-                                tz=tz)
-clean_data['wind direction (deg)'][time_index_tbc] += 180
-clean_data['wind direction (deg)'][clean_data['wind direction (deg)']>360] -=360
-
-#retrieve data from second weather station, dataindex in UTC?
-dic_columns = {'GHI_2nd station (W.m-2)':'glorad',
-               'Ambient Temperature_2nd station (Deg C)':'metp',
-               'wind velocity_2nd station 2m height (m.s-1)': 'wv2', 
-               'wind direction_2nd station 2m height (deg)':'wd2',
-               'wind velocity_2nd station 10m height (m.s-1)': 'meanwv', 
-               'wind direction_2nd station 10m height (deg)':'meanwd'
-            
-               }
-
-fn = 'data/weather_station_6069/557669425.csv'
-
-clean_data = retrieve_weather_station6069(fn, 
+
+
+# clean_data columns and the (name, unit, processing) columns in Table2 of 
+# the weather station they are read from
+weather_station_columns = {'GHI_SPN1 (W.m-2)':('Global_Avg', 'W.m-2', 'Avg'),
+                           'DHI_SPN1 (W.m-2)':('Diffuse_Avg', 'W.m-2', 'Avg'),
+                           'GHI (W.m-2)':('Solar_Wm2_2_Avg', 'W/m²', 'Avg'),
+                           'Albedometer (W.m-2)':('Solar_Wm2_1_Avg', 'W/m²', 'Avg'),
+                           'PAR (umol.s-1.m-2)':('PAR_Den_Avg', 'umol/s/m^2', 'Avg'),
+                           'Ambient Temperature (Deg C)':('AirTC_Avg', 'Deg C', 'Avg'),
+                           'Relative Humidity (%)':('RH', '%', 'Smp'),
+                           'Reference Cell Tilted facing up (W.m-2)':('CS325DM_Analog1_1_Avg', 'W/m²', 'Avg'),
+                           'Reference Cell Tilted facing down (W.m-2)':('CS325DM_Analog1_2_Avg', 'W/m²', 'Avg'),
+                           'Reference Cell Vertical East (W.m-2)':('CS325DM_Analog1_3_Avg', 'W/m²', 'Avg'),
+                           'Reference Cell Vertical West (W.m-2)':('CS325DM_Analog1_4_Avg', 'W/m²', 'Avg')} 
+
+# known sensor incidents, applied in this order by the corrections stage 
+# (see corrections.py for the format of the rules)
+sensor_corrections = [
+    # reference cell facing up were not properly working (broken wires)
+    # from 18/05/2023 to 19/05/2023 and from 15/06/2023 to 06/09/2023 
+    {'action': 'mask', 
+     'columns': ['Reference Cell Tilted facing up (W.m-2)'],
+     'start': '2023-05-18 00:00:00', 'end': '2023-05-19 00:00:00'},
+    {'action': 'mask', 
+     'columns': ['Reference Cell Tilted facing up (W.m-2)'],
+     'start': '2023-06-15 00:00:00', 'end': '2023-09-06 00:00:00'},
+    # reference cell in vertical setup were not properly working (broken wire)
+    # from 14/08/2023 to 07/09/2023 
+    {'action': 'mask', 
+     'columns': ['Reference Cell Vertical East (W.m-2)', 
+                 'Reference Cell Vertical West (W.m-2)'],
+     'start': '2023-08-14 00:00:00', 'end': '2023-09-07 00:00:00'},
+    # when vertical reference cells were connected on 2023/09/07 the input
+    # were swapt between vertical and tilted
+    {'action': 'swap', 
+     'columns': [('Reference Cell Tilted facing up (W.m-2)', 
+                  'Reference Cell Vertical East (W.m-2)'),
+                 ('Reference Cell Tilted facing down (W.m-2)', 
+                  'Reference Cell Vertical West (W.m-2)')],
+     'start': '2023-09-07 00:00:00'},
+    # 2-hour shift in weather station data from 04/07/2023 
+    {'action': 'shift', 
+     'columns': list(weather_station_columns),
+     'start': '2023-07-04 00:00:00', 
+     'value': '-2h'},
+    # measuring errors in temperature sensor and relative humidity sensor
+    {'action': 'mask', 'columns': ['Ambient Temperature (Deg C)'], 'below': -80.0},
+    {'action': 'mask', 'columns': ['Relative Humidity (%)'], 'equal': -100.0},
+    # Before 06/09/2023 the wind sensor was incorrectly monted, on that date,
+    # it was rotated 180 degrees
+    {'action': 'offset', 
+     'columns': ['wind direction (deg)'],
+     'end': '2023-09-07 00:00:00', 
+     'value': 180},
+    {'action': 'offset', 'columns': ['wind direction (deg)'], 'above': 360, 'value': -360},
+]
+
+
+
+def stage_inverter(clean_data, workers=1):
+
+    """
+    Retrieve data from inverters, dateindex in CET/CEST (indicated by DST)
+    """
+
+    data_path='data/inverter_monthly_datafiles/'
+    clean_data = retrieve_inverter(data_path, 
+                                   clean_data, 
+                                   start_date = '2023-04-01 00:00:00', #'2024-02-01 00:00:00'
+                                   end_date = end_date, 
+                                   tz='CET',
+                                   workers=workers)
+    return clean_data
+
+
+
+def stage_weather_station(clean_data):
+
+    """
+    Retrieve irradiance, temperature and humidity from the weather station
+    """
+
+    #retrieve data from weather station, dataindex in UTC
+    fn = 'data/weather_station_data/CR1000XSeries_2_Table2.dat'
+    dic_columns = weather_station_columns
+
+    clean_data = retrieve_weather_station(fn, 
+                                          clean_data, 
+                                          dic_columns, 
+                                          start_date, 
+                                          end_date, 
+                                          tz='UTC') 
+
+    # #Data from weather station from 2023/04/18 to 2023/08/25 
+    fn = 'data/weather_station_data/CR1000XSeries_Table2_old.dat'
+    clean_data = retrieve_weather_station(fn, 
+                                          clean_data, 
+                                          dic_columns, 
+                                          start_date = '2023-04-18 00:00:00', 
+                                          end_date = '2023-08-25 23:55:00', 
+                                          tz = 'UTC') 
+
+
+    return clean_data
+
+
+
+def stage_wind(clean_data):
+
+    """
+    Retrieve data from the wind sensor in the weather station
+    """
+
+    #Retrieve weather station data - wind sensor
+    fn = 'data/weather_station_data/CR1000XSeries_2_Table1.dat'
+    dic_columns = {'wind velocity (m.s-1)':('WS_ms_S_WVT', 'meters/second', 'WVc'),
+                   'wind direction (deg)':('WindDir_D1_WVT', 'Deg', 'WVc'),
+                   'wind gust (m.s-1)': ('Gust3s_Max', 'Unnamed: 4_level_1', 'Max')}
+
+    clean_data = retrieve_weather_station(fn, 
                                           clean_data, 
                                           dic_columns, 
                                           start_date, 
                                           end_date, 
-                                          tz='UTC')
-
-# Plot summary of available clean data
-cols = [i for i in clean_data.columns if i not in ['TBF inverter status', 'VBF inverter status']]
-clean_data_plot=clean_data[cols]
-clean_data_plot=clean_data_plot.astype(float)
-plt.subplots(figsize=(20,15))
-ax = sns.heatmap(clean_data_plot.loc[time_index_hour].abs()/clean_data_plot.loc[time_index_hour].abs().max(), 
-                 cmap="plasma", mask=clean_data_plot.loc[time_index_hour].isnull())
-ticklabels = [time_index_hour[int(tick)].strftime('%Y-%m-%d') for tick in ax.get_yticks()]
-ax.set_yticklabels(ticklabels);
-plt.savefig('Figures/summary_clean_data.jpg', dpi=300, bbox_inches='tight')
+                                          tz='UTC')  
+
+    #Retrieve weather station data - wind sensor from 2023/04/18 to 2023/08/25 
+    fn = 'data/weather_station_data/CR1000XSeries_Table1_old.dat'
+    clean_data = retrieve_weather_station(fn, 
+                                          clean_data, 
+                                          dic_columns, 
+                                          start_date = '2023-04-18 00:00:00', 
+                                          end_date = '2023-08-25 23:55:00', 
+                                          tz = 'UTC') 
+
+    return clean_data
+
+
+
+def stage_weather_station6069(clean_data):
+
+    """
+    Retrieve data from second weather station 6069
+    """
+
+    #retrieve data from second weather station, dataindex in UTC?
+    dic_columns = {'GHI_2nd station (W.m-2)':'glorad',
+                   'Ambient Temperature_2nd station (Deg C)':'metp',
+                   'wind velocity_2nd station 2m height (m.s-1)': 'wv2', 
+                   'wind direction_2nd station 2m height (deg)':'wd2',
+                   'wind velocity_2nd station 10m height (m.s-1)': 'meanwv', 
+                   'wind direction_2nd station 10m height (deg)':'meanwd'
+
+                   }
+
+    # older export first, values in the latest export are kept
+    fns = ['data/weather_station_6069/OLD_DATA/522945015.csv',
+           'data/weather_station_6069/557669425.csv']
+
+    clean_data = retrieve_weather_station6069(fns, 
+                                              clean_data, 
+                                              dic_columns, 
+                                              start_date, 
+                                              end_date, 
+                                              tz='UTC')
+    return clean_data
+
+
+
+def stage_corrections(clean_data):
+
+    """
+    Correct the known sensor incidents listed in sensor_corrections
+    """
+
+    return corrections.apply_corrections(clean_data, sensor_corrections)
+
+
+
+# stages building clean_data, in order
+stages = {'inverter': stage_inverter,
+          'weather_station': stage_weather_station,
+          'wind': stage_wind,
+          'weather_station6069': stage_weather_station6069,
+          'corrections': stage_corrections}
+checkpoint_path = 'resources/checkpoints/'
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes used to parse the inverter datafiles')
+    parser.add_argument('--checkpoint', action='store_true',
+                        help='store clean_data in {} after every stage'.format(checkpoint_path))
+    parser.add_argument('--from-stage', choices=list(stages), default='inverter',
+                        help='start from this stage using the checkpoint of the previous one')
+    args = parser.parse_args()
+
+    time_index_hour = pd.date_range(start=start_date, 
+                                    end=end_date, 
+                                    freq='H',  
+                                    tz=tz)
+
+    names = list(stages)
+    first = names.index(args.from_stage)
+    if first == 0:
+        # Create empty dataframe to be populated
+        time_index = pd.date_range(start=start_date, 
+                                   end=end_date, 
+                                   freq='5min',  
+                                   tz=tz)
+        clean_data=pd.DataFrame(index=time_index)   
+    else:
+        clean_data = pd.read_parquet(checkpoint_path 
+                                     + '{}.parquet'.format(names[first-1]))
+
+    # clean_data is built in memory and stored once all stages are done
+    stage_kwargs = {'inverter': {'workers': args.workers}}
+    for name in names[first:]:
+        print('stage ' + name)
+        clean_data = stages[name](clean_data, **stage_kwargs.get(name, {}))
+        if args.checkpoint:
+            os.makedirs(checkpoint_path, exist_ok=True)
+            clean_data.to_parquet(checkpoint_path + '{}.parquet'.format(name))
+
+    clean_data.to_csv('resources/clean_data.csv')
+
+    # store also as a columnar dataset partitioned by month, used by the 
+    # analysis scripts through foulum_data.load()
+    foulum_data.save(clean_data)
+
+    # hourly, daily and monthly energy and irradiation, read by the analysis
+    # scripts through foulum_data.load_rollup()
+    foulum_data.save_rollups(clean_data)
+
+    # Plot summary of available clean data
+    cols = [i for i in clean_data.columns if i not in ['TBF inverter status', 'VBF inverter status']]
+    clean_data_plot=clean_data[cols]
+    clean_data_plot=clean_data_plot.astype(float)
+    plt.subplots(figsize=(20,15))
+    ax = sns.heatmap(clean_data_plot.loc[time_index_hour].abs()/clean_data_plot.loc[time_index_hour].abs().max(), 
+                     cmap="plasma", mask=clean_data_plot.loc[time_index_hour].isnull())
+    ticklabels = [time_index_hour[int(tick)].strftime('%Y-%m-%d') for tick in ax.get_yticks()]
+    ax.set_yticklabels(ticklabels);
+    plt.savefig('Figures/summary_clean_data.jpg', dpi=300, bbox_inches='tight')
 
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compare speed and accuracy of the irradiance models in bifacial_irradiance.py,
+pvfactors (reference) and infinite sheds, for the vertical and tilted
+installations in Foulum with the PVGIS TMY. The report is printed and stored
+in 'resources/irradiance_backends.csv'.
+"""
+
+import os
+import time
+import numpy as np
+import pandas as pd
+import pvlib
+import bifacial_irradiance
+import pvgis_tmy
+import estimate_annual_yield as foulum
+
+report_fn = 'resources/irradiance_backends.csv'
+
+
+def compare(jobs, weather, solar_position, module, temperature_model_parameters):
+
+    """
+    Return a table with, for every layout in jobs = {name: job} and every
+    backend, the calculation time, the annual front, back and effective
+    irradiation, the specific yield and the differences from pvfactors
+    """
+
+    rows = []
+    for name, job in jobs.items():
+        effective = {}
+        for backend in ['pvfactors', 'infinite_sheds']:
+            start = time.perf_counter()
+            irrad = bifacial_irradiance.row_irradiance(job['tilt'],
+                                                       job['orientation'],
+                                                       weather.index,
+                                                       weather['dni'],
+                                                       weather['dhi'],
+                                                       solar_position['azimuth'],
+                                                       solar_position['apparent_zenith'],
+                                                       job['pvrow_height'],
+                                                       job['pvrow_width'],
+                                                       job['albedo'],
+                                                       job['gcr'],
+                                                       backend=backend,
+                                                       cache_path=None)
+            seconds = time.perf_counter() - start
+
+            effective[backend] = (irrad['total_abs_front']
+                                  + job['bifaciality']*irrad['total_abs_back'])
+            cell_temperature = pvlib.temperature.sapm_cell(effective[backend],
+                                                           weather['temp_air'],
+                                                           weather['wind_speed'],
+                                                           **temperature_model_parameters,)
+            dc_power = bifacial_irradiance.sapm_daytime(effective[backend],
+                                                        cell_temperature,
+                                                        module,
+                                                        solar_position['apparent_zenith'])
+            reference = effective['pvfactors']
+            rows.append({'layout': name,
+                         'backend': backend,
+                         'time (s)': seconds,
+                         'front irradiation (kWh.m-2)': 0.001*irrad['total_abs_front'].sum(),
+                         'back irradiation (kWh.m-2)': 0.001*irrad['total_abs_back'].sum(),
+                         'effective irradiation (kWh.m-2)': 0.001*effective[backend].sum(),
+                         'specific yield (kWh/kWp)': dc_power['p_mp'].sum()/(module['Impo']*module['Vmpo']),
+                         'hourly nRMSE (%)': 100*np.sqrt(((effective[backend] - reference)**2).mean())/reference.mean()})
+
+    report = pd.DataFrame(rows)
+    first = report.groupby('layout').transform('first')
+    report['speed-up vs pvfactors'] = first['time (s)']/report['time (s)']
+    for column in ['effective irradiation (kWh.m-2)', 'specific yield (kWh/kWp)']:
+        report[column.split(' (')[0] + ' vs pvfactors (%)'] = 100*(report[column]/first[column] - 1)
+    return report
+
+
+
+if __name__ == '__main__':
+
+    tmy = pvgis_tmy.get_tmy(foulum.lat, foulum.lon)
+    tmy.index = tmy.index.tz_convert(foulum.tz)
+    solar_position = foulum.location.get_solarposition(times=tmy.index)
+
+    jobs = {name: dict(foulum.layouts[name], gcr=gcr, albedo=foulum.albedo,
+                       bifaciality=foulum.bifaciality)
+            for name, gcr in [('vertical', foulum.gcr_v), ('tilted', foulum.gcr_t)]}
+    report = compare(jobs, tmy, solar_position, foulum.module,
+                     foulum.temperature_model_parameters)
+    os.makedirs(os.path.dirname(report_fn), exist_ok=True)
+    report.to_csv(report_fn, index=False)
+    print(report.round(3).to_string(index=False))
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""
+Apply corrections for known sensor incidents to the clean data.
+
+Every correction is a rule, a dictionary with the keys:
+
+    'action'  : 'mask'   -> set values to NaN
+                'swap'   -> exchange the values of pairs of columns
+                'shift'  -> move values in time, value(t) = value(t - 'value')
+                'offset' -> add 'value'
+                'clip'   -> limit values to the interval 'value' = (min, max)
+    'columns' : list of columns, or list of (column, column) pairs for 'swap'
+    'start'   : first timestamp of the time window (optional, UTC if no time
+                zone is given)
+    'end'     : last timestamp of the time window (optional, included)
+    'value'   : parameter of the action, see above
+    'below', 'above', 'equal' : optional, the rule only applies to values
+                below, above or equal to the given value
+
+Rules are applied in order, using boolean masks on the sorted time index.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def apply_corrections(data, rules):
+
+    """
+    Return a copy of data with the correction rules applied in order
+    """
+
+    data = data.sort_index()
+    for rule in rules:
+        window = time_window(data.index, rule.get('start'), rule.get('end'))
+        action = rule['action']
+
+        if action == 'swap':
+            for a, b in rule['columns']:
+                values_a = data[a].to_numpy(dtype=float, copy=True)
+                values_b = data[b].to_numpy(dtype=float, copy=True)
+                values_a[window], values_b[window] = values_b[window], values_a[window]
+                data[a], data[b] = values_a, values_b
+            continue
+
+        if action == 'shift':
+            shift = pd.Timedelta(rule['value'])
+            # only timestamps whose source timestamp is in data are shifted
+            window = window & (data.index - shift).isin(data.index)
+            shifted = data[rule['columns']].shift(freq=shift).reindex(data.index)
+
+        for column in rule['columns']:
+            values = data[column].to_numpy(dtype=float, copy=True)
+            mask = window & value_condition(values, rule)
+            if action == 'mask':
+                values[mask] = np.nan
+            elif action == 'shift':
+                values[mask] = shifted[column].to_numpy()[mask]
+            elif action == 'offset':
+                values[mask] += rule['value']
+            elif action == 'clip':
+                values[mask] = np.clip(values[mask], *rule['value'])
+            else:
+                raise ValueError('unknown correction action ' + action)
+            data[column] = values
+
+    return data
+
+
+
+def time_window(index, start=None, end=None):
+
+    """
+    Boolean mask of the timestamps in the sorted index between start and
+    end (both included)
+    """
+
+    window = np.zeros(len(index), dtype=bool)
+    i0 = 0 if start is None else index.searchsorted(_localize(start, index), 'left')
+    i1 = len(index) if end is None else index.searchsorted(_localize(end, index), 'right')
+    window[i0:i1] = True
+    return window
+
+
+
+def value_condition(values, rule):
+
+    """
+    Boolean mask of the values fulfilling the 'below', 'above' and 'equal'
+    conditions of a rule
+    """
+
+    condition = np.ones(len(values), dtype=bool)
+    if 'below' in rule:
+        condition &= values < rule['below']
+    if 'above' in rule:
+        condition &= values > rule['above']
+    if 'equal' in rule:
+        condition &= values == rule['equal']
+    return condition
+
+
+
+def _localize(timestamp, index):
+
+    """
+    Return timestamp in the time zone of index, naive timestamps are
+    assumed to be in UTC
+    """
+
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize('UTC')
+    return timestamp.tz_convert(index.tz)
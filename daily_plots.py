@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+"""
+Render daily plots for many days, in a pool of processes.
+
+Used by daily_profile.py and daily_profile_test.py. Every process reads the
+data it needs through foulum_data.load(), which keeps the decoded months in
+memory, so consecutive days are sent to the same process. Days whose
+figures are up to date in the manifest of figure_cache are not rendered
+again, unless --force is given.
+"""
+
+import argparse
+import functools
+import math
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import figure_cache
+
+
+def parse_arguments(description, start_date, end_date, tz='UTC', reuse_figures=False):
+
+    """
+    Parse the command line options selecting the days to plot and the
+    number of processes. Returns the days to plot and the parsed options.
+
+    If reuse_figures, the option --reuse-figures is added for scripts whose
+    plot_day can update the lines of the figures of the previous day.
+    """
+
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--start', default=start_date,
+                        help='first day to plot (default {})'.format(start_date))
+    parser.add_argument('--end', default=end_date,
+                        help='last day to plot (default {})'.format(end_date))
+    parser.add_argument('--days', nargs='+',
+                        help='days to plot (YYYY-MM-DD), instead of --start to --end')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes rendering the plots')
+    parser.add_argument('--force', action='store_true',
+                        help='render the figures even if their data did not change')
+    if reuse_figures:
+        parser.add_argument('--reuse-figures', action='store_true',
+                            help='build the figures once per process and only update their data')
+    args = parser.parse_args()
+
+    if args.days:
+        days = pd.DatetimeIndex(args.days).normalize().tz_localize(tz)
+    else:
+        days = pd.date_range(start=args.start,
+                             end=args.end,
+                             freq='D',
+                             tz=tz)
+    return days, args
+
+
+
+def render(plot_day, days, workers=1, **kwargs):
+
+    """
+    Call plot_day(day, **kwargs) for every day, in a pool of processes if
+    workers > 1.
+
+    plot_day must be a module-level function that closes the figures it
+    creates or reuses them for the next day, so the memory used by every
+    process stays flat. It returns {figure file: key} for the figures it
+    rendered, which are stored in the manifest of figure_cache at the end
+    (also if rendering is interrupted).
+    """
+
+    plot_day = functools.partial(plot_day, **kwargs)
+    entries = {}
+    try:
+        if workers > 1:
+            chunksize = max(1, math.ceil(len(days) / (4*workers)))
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for rendered in executor.map(plot_day, days, chunksize=chunksize):
+                    entries.update(rendered)
+        else:
+            for day in days:
+                entries.update(plot_day(day))
+    finally:
+        figure_cache.record(entries)
+    return entries
@@ -1,67 +1,163 @@
 # -*- coding: utf-8 -*-
 """
-Create a daily plot with electricity generation and 
+Create a daily plot with electricity generation and
 power generation per row of solar panels
 """
 
+import matplotlib
+matplotlib.use('Agg')
 import pandas as pd
 import matplotlib.pyplot as plt
-import matplotlib.gridspec as gridspec 
-
-data=pd.read_csv('resources/clean_data.csv',
-                 index_col=0)
-
-data.index = pd.to_datetime(data.index, utc=True) 
+import matplotlib.gridspec as gridspec
+import foulum_data
+import figure_cache
+import daily_plots
 
 start_date = '2023-05-01 00:00:00'
 end_date =  '2024-10-30 00:00:00'
-tz='UTC' 
-time_index_day = pd.date_range(start=start_date, 
-                                 end=end_date, 
-                                 freq='D',  
-                                 tz=tz)
-
-for day in time_index_day:
-    time_index = pd.date_range(start=day, 
-                           periods=24*12*1, 
-                           freq='5min',
-                           tz=tz)
-    
-    #power generation inverter
-    plt.figure(figsize=(8, 6))
+tz='UTC'
+
+columns = (['INV-1-TBF Total input power (kW)', 'INV-2-VBF Total input power (kW)']
+           + ['VBF PV{} input {}'.format(i, q) for i in ['1', '2', '3', '4']
+              for q in ['current (A)', 'voltage (V)']])
+
+
+# figure templates of this process, {name: (figure, lines, bbox)}, used when the
+# figures are reused from day to day
+_figures = {}
+
+
+def power_figure(series, time_index):
+
+    """
+    Create the figure with the power generation of both inverters, returns
+    the figure and its lines
+    """
+
+    fig = plt.figure(figsize=(8, 6))
     gs1 = gridspec.GridSpec(1, 1)
     ax0 = plt.subplot(gs1[0,0])
-    ax0.plot(data['INV-1-TBF Total input power (kW)'][time_index], 
-              color='dodgerblue',
-              label='INV-1-TBF Total input power (kW)')
-    ax0.plot(data['INV-2-VBF Total input power (kW)'][time_index], 
-              color='firebrick',
-              label='INV-2-VBF Total input power (kW)')
+    lines = []
+    for s, color in zip(series, ['dodgerblue', 'firebrick']):
+        lines += ax0.plot(s,
+                          color=color,
+                          label=s.name)
     ax0.set_ylim([0,40])
     ax0.set_ylabel('DC Power (kW)')
     plt.setp(ax0.get_xticklabels(), ha="right", rotation=45)
     ax0.grid('--')
     ax0.legend()
-    plt.savefig('Figures/daily_profiles/power_generation_{}_{}_{}.jpg'.format(day.year, str(day.month).zfill(2), str(day.day).zfill(2)), 
-                dpi=100, bbox_inches='tight')
-    
-    #power generation per string
-    plt.figure(figsize=(8, 6))
+    return fig, lines
+
+
+
+def strings_figure(series, time_index):
+
+    """
+    Create the figure with the power generation per string, returns the
+    figure and its lines
+    """
+
+    fig = plt.figure(figsize=(8, 6))
     gs1 = gridspec.GridSpec(1, 1)
     ax0 = plt.subplot(gs1[0,0])
-    for i in ['1', '2', '3', '4']:
-        ax0.plot(0.001*data['VBF PV{} input voltage (V)'.format(i)][time_index]*data['VBF PV{} input current (A)'.format(i)][time_index], 
-             label='VBF PV{} power (kW)'.format(i))
-    
+    lines = []
+    for s in series:
+        lines += ax0.plot(s,
+                          label=s.name)
+
     ax0.set_ylim([0,10])
     ax0.set_xlim(time_index[0], time_index[-1])
     ax0.set_ylabel('DC Power (kW)')
     plt.setp(ax0.get_xticklabels(), ha="right", rotation=45)
     ax0.grid('--')
     ax0.legend()
-    plt.savefig('Figures/daily_profiles/strings_vertical_{}_{}_{}.jpg'.format(day.year, str(day.month).zfill(2), str(day.day).zfill(2)), 
-                dpi=100, bbox_inches='tight')
+    return fig, lines
+
+
+
+def update_figure(fig, lines, series, time_index):
+
+    """
+    Replace the data of the lines of a figure created by power_figure() or
+    strings_figure(), keeping axes, legend and grid
+    """
+
+    for line, s in zip(lines, series):
+        line.set_data(s.index, s.values)
+    ax0 = fig.axes[0]
+    if ax0.get_autoscalex_on():
+        ax0.relim()
+        ax0.autoscale_view(scaley=False)
+    else:
+        ax0.set_xlim(time_index[0], time_index[-1])
+    plt.setp(ax0.get_xticklabels(), ha="right", rotation=45)
+
+
+
+def plot_day(day, reuse_figures=False, force=False):
+
+    """
+    Plot power generation of both inverters and of the vertical strings.
+
+    If reuse_figures, the figures are created for the first day plotted by
+    this process and only the data of their lines is replaced afterwards,
+    which avoids building axes, legend and grid for every day.
+
+    Figures whose data did not change since they were rendered are skipped,
+    unless force. Returns {figure file: key} of the rendered figures.
+    """
+
+    time_index = pd.date_range(start=day,
+                           periods=24*12*1,
+                           freq='5min',
+                           tz=tz)
+    data = foulum_data.load(columns=columns,
+                            start=time_index[0],
+                            end=time_index[-1])
+
+    #power generation inverter
+    power = [data[c][time_index] for c in ['INV-1-TBF Total input power (kW)',
+                                           'INV-2-VBF Total input power (kW)']]
+
+    #power generation per string
+    strings = [(0.001*data['VBF PV{} input voltage (V)'.format(i)][time_index]
+                *data['VBF PV{} input current (A)'.format(i)][time_index]).rename('VBF PV{} power (kW)'.format(i))
+               for i in ['1', '2', '3', '4']]
+
+    rendered = {}
+    for name, create, series in [('power_generation', power_figure, power),
+                                 ('strings_vertical', strings_figure, strings)]:
+        fn = 'Figures/daily_profiles/{}_{}_{}_{}.jpg'.format(name, day.year, str(day.month).zfill(2), str(day.day).zfill(2))
+        key = figure_cache.data_key(pd.concat(series, axis=1), script=__file__)
+        if not force and figure_cache.up_to_date([fn], key):
+            continue
+
+        if reuse_figures and name in _figures:
+            fig, lines, bbox = _figures[name]
+            update_figure(fig, lines, series, time_index)
+        else:
+            fig, lines = create(series, time_index)
+            bbox = 'tight'
+        fig.savefig(fn, dpi=100, bbox_inches=bbox)
+        if reuse_figures:
+            # the tight bounding box of the first day is kept, which saves
+            # drawing the figure twice in savefig
+            if bbox == 'tight':
+                bbox = fig.get_tightbbox().padded(plt.rcParams['savefig.pad_inches'])
+            _figures[name] = (fig, lines, bbox)
+        else:
+            plt.close(fig)
+        rendered[fn] = key
+    return rendered
+
 
 
+if __name__ == '__main__':
 
-   
\ No newline at end of file
+    # e.g. python daily_profile.py --start 2024-05-01 --end 2024-05-31 --workers 8
+    # add --reuse-figures to update the lines of the same figures every day
+    time_index_day, args = daily_plots.parse_arguments(__doc__, start_date, end_date, tz,
+                                                       reuse_figures=True)
+    daily_plots.render(plot_day, time_index_day, workers=args.workers,
+                       reuse_figures=args.reuse_figures, force=args.force)
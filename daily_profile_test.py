@@ -4,30 +4,49 @@ Create a daily plot with electricity generation and
 solar irradiance measurements
 """
 
+import matplotlib
+matplotlib.use('Agg')
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec 
-
-data=pd.read_csv('resources/clean_data.csv',
-                 index_col=0)
-
-data.index = pd.to_datetime(data.index, utc=True) 
+import foulum_data
+import figure_cache
+import daily_plots
 
 start_date = '2024-10-01 00:00:00' #'2023-05-01 00:00:00'
 end_date =  '2025-09-01 00:00:00'
 tz='UTC' 
-time_index_day = pd.date_range(start=start_date, 
-                                  end=end_date, 
-                                  freq='D',  
-                                  tz=tz)
 
-for day in time_index_day:
+columns = ['INV-1-TBF Total input power (kW)',
+           'INV-2-VBF Total input power (kW)',
+           'GHI (W.m-2)',
+           'Reference Cell Tilted facing up (W.m-2)',
+           'Reference Cell Tilted facing down (W.m-2)',
+           'Reference Cell Vertical East (W.m-2)',
+           'Reference Cell Vertical West (W.m-2)']
+
+
+def plot_day(day, force=False):
+
+    """
+    Plot power generation and irradiance on the plane of array of both 
+    installations. The figure is skipped if its data did not change since it 
+    was rendered, unless force. Returns {figure file: key} if rendered.
+    """
+
     time_index = pd.date_range(start=day, 
                            periods=24*12*1, 
                            freq='5min',
                            tz=tz)
+    data = foulum_data.load(columns=columns,
+                            start=time_index[0], 
+                            end=time_index[-1])
+    fn = 'Figures/daily_profiles_test/test_{}_{}_{}.jpg'.format(day.year, str(day.month).zfill(2), str(day.day).zfill(2))
+    key = figure_cache.data_key(data, script=__file__)
+    if not force and figure_cache.up_to_date([fn], key):
+        return {}
     
-    plt.figure(figsize=(18, 18))
+    fig = plt.figure(figsize=(18, 18))
     gs1 = gridspec.GridSpec(2, 5)
     gs1.update(wspace=0.2, hspace=0.2)
     ax1 = plt.subplot(gs1[0,0:3]) 
@@ -88,9 +107,15 @@ for day in time_index_day:
     ax2.set_xlim([time_index[0], time_index[-1]])
     ax5.set_xlim([time_index[0], time_index[-1]])
     ax6.set_xlim([time_index[0], time_index[-1]])
-    plt.savefig('Figures/daily_profiles_test/test_{}_{}_{}.jpg'.format(day.year, str(day.month).zfill(2), str(day.day).zfill(2)), 
-                dpi=100, bbox_inches='tight')
+    plt.savefig(fn, dpi=100, bbox_inches='tight')
+    plt.close(fig)
+    return {fn: key}
+
 
 
+if __name__ == '__main__':
 
-   
\ No newline at end of file
+    # e.g. python daily_profile_test.py --days 2024-10-05 2024-10-06 --workers 2
+    time_index_day, args = daily_plots.parse_arguments(__doc__, start_date, end_date, tz)
+    daily_plots.render(plot_day, time_index_day, workers=args.workers,
+                       force=args.force)
@@ -8,6 +8,9 @@ Calculate efficiency for both systems
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec 
+import foulum_data
+import figure_cache
+import poa_efficiency
 date ='2024-09-19 '
 start_date = date +'00:00:00' #day to be ploted
 tz = 'UCT' 
@@ -20,29 +23,38 @@ end_t2 = date + '16:00:00'
 start_v = date + '13:30:00' 
 end_v = date + '17:00:00' 
 
-data=pd.read_csv('resources/clean_data.csv',
-                 index_col=0)
-
-data.index = pd.to_datetime(data.index, utc=True) 
-
-
 time_index_day = pd.date_range(start=start_date, 
                            periods=24*1*12, 
                            freq='5min',
                            tz=tz)
 
-area = 80*2.280*1.134 #80 PV panels per inverter
-bifaciality=0.8
-
-irradiance_tilted = (data['Reference Cell Tilted facing up (W.m-2)'] +
-                     bifaciality*data['Reference Cell Tilted facing down (W.m-2)'])
-
-irradiance_vertical = (bifaciality*data['Reference Cell Vertical East (W.m-2)']
-                       + data['Reference Cell Vertical West (W.m-2)'])
-
-data['Efficiency INV-1-TBF'] = (1000/area)* data['INV-1-TBF Total input power (kW)'] / irradiance_tilted
-
-data['Efficiency INV-2-VBF'] = (1000/area)* data['INV-2-VBF Total input power (kW)'] / irradiance_vertical
+columns = (['INV-1-TBF Total input power (kW)',
+            'INV-2-VBF Total input power (kW)',
+            'GHI (W.m-2)',
+            'Reference Cell Tilted facing up (W.m-2)',
+            'Reference Cell Tilted facing down (W.m-2)',
+            'Reference Cell Vertical East (W.m-2)',
+            'Reference Cell Vertical West (W.m-2)']
+           + ['{} PV{} input {}'.format(s, i, q) for s in ['TBF', 'VBF'] 
+              for i in range(1, 5) for q in ['current (A)', 'voltage (V)']])
+data = foulum_data.load(columns=columns,
+                        start=time_index_day[0], 
+                        end=time_index_day[-1])
+
+area = poa_efficiency.area
+bifaciality = poa_efficiency.bifaciality
+
+data = data.join(poa_efficiency.efficiency(data, area=area, bifaciality=bifaciality))
+
+# the figures are only saved again if the data of the day, the time windows
+# or this script changed (or a figure file is missing)
+fns = ['Figures/efficiency_analysis/Efficiency_analysis_{}.jpg'.format(date),
+       'Figures/efficiency_analysis/voltage_current_{}.jpg'.format(date)]
+params = {'windows': [start_t, end_t, start_t2, end_t2, start_v, end_v],
+          'area': area,
+          'bifaciality': bifaciality}
+key = figure_cache.data_key(data, params, script=__file__)
+render = not figure_cache.up_to_date(fns, key)
 
 #%%
 plt.figure(figsize=(18, 30))
@@ -164,7 +176,8 @@ ax5.grid('--')
 ax5.set_ylim([0.15, 0.20])
 ax5.legend(fontsize=14, bbox_to_anchor=(1.4, 0.4))
 
-plt.savefig('Figures/efficiency_analysis/Efficiency_analysis_{}.jpg'.format(date), dpi=300, bbox_inches='tight')
+if render:
+    plt.savefig(fns[0], dpi=300, bbox_inches='tight')
 
 #%%
 plt.figure(figsize=(6, 6))
@@ -188,4 +201,6 @@ for i in range(1,5):
 ax0.set_ylabel('voltage (V)')
 ax0.set_xlabel('current (A)')
 ax0.legend(fontsize=14, bbox_to_anchor=(1.4, 0.4))
-plt.savefig('Figures/efficiency_analysis/voltage_current_{}.jpg'.format(date), dpi=300, bbox_inches='tight')
+if render:
+    plt.savefig(fns[1], dpi=300, bbox_inches='tight')
+    figure_cache.record(dict.fromkeys(fns, key))
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+
+"""
+Detect faults and outages of the inverters in the 5-minute clean data.
+
+Five types of events are flagged for every system (TBF, VBF):
+
+- 'low power': the AC power is below low_power_ratio times the power
+  expected from the capacity and the bifacial POA irradiance of the
+  reference cells, while the POA irradiance is above min_irradiance
+- 'no data': the AC power is missing while the POA irradiance is above
+  min_irradiance, only within the span of the available inverter data, so
+  an inverter workbook that has not arrived yet is not an outage
+- 'status': the inverter status is not a normal operating status (see
+  normal_statuses), the detail is the transition into it. Placeholders
+  of a missing status (see missing_statuses) are ignored
+- 'clipping': the AC power is at the AC limit of the inverter, or, if the
+  limit is not given, flat at a high level while the irradiance changes
+- 'string dropout': the current of one string is zero while the other
+  strings of the inverter are producing
+
+Every event is a run of consecutive samples and is stored with its system,
+type, first and last sample, duration and detail in
+'resources/fault_events.parquet'. refresh() only processes the data after
+the last processed sample with inverter data (stored in
+'resources/fault_events.json'), events that were still going on are
+detected again from their beginning, e.g.
+
+    python fault_detection.py            # process the new data
+    python fault_detection.py --rebuild  # process the whole history
+"""
+
+import argparse
+import json
+import os
+import numpy as np
+import pandas as pd
+import foulum_data
+import performance_ratio
+
+events_fn = 'resources/fault_events.parquet'
+state_fn = 'resources/fault_events.json'
+
+# inverter, status column, capacity (kWp), reference cells and AC limit (kW)
+# of every system, clipping is detected as flat AC power if the AC limit is None
+systems = {system: dict(performance_ratio.inverters[inverter],
+                        inverter=inverter,
+                        status=system + ' inverter status',
+                        ac_limit=None)
+           for system, inverter in [('TBF', 'INV-1-TBF'), ('VBF', 'INV-2-VBF')]}
+
+bifaciality = performance_ratio.bifaciality
+
+# statuses (lower case beginning) of an inverter operating normally
+normal_statuses = ('grid connected', 'grid-connected', 'on-grid', 'standby', 'starting')
+
+# placeholders of the inverter exports for a missing status
+missing_statuses = ('', '-', 'nan', 'none')
+
+min_irradiance = 100       # POA irradiance of daylight (W.m-2)
+low_power_ratio = 0.1      # AC power / expected power of low power events
+clipping_fraction = 0.99   # AC power / AC limit of clipping events
+clipping_level = 0.5       # AC power / capacity of flat power clipping events
+flat_tolerance = 0.001     # relative change of flat AC power between samples
+min_current = 0.5          # mean current (A) of the producing strings
+dropout_current = 0.1      # current (A) of a string that dropped out
+
+# minimum number of consecutive samples of every type of event
+min_samples = {'low power': 3, 'no data': 3, 'status': 1, 'clipping': 4, 'string dropout': 3}
+
+# hours between samples of the clean data
+sample_hours = 5/60
+
+event_columns = ['system', 'event', 'start', 'end', 'duration (h)', 'detail']
+
+
+def inverter_columns(systems=systems):
+
+    """
+    Return the clean data columns of the inverters (AC power, status and
+    string currents)
+    """
+
+    return [c for system, config in systems.items()
+            for c in ([config['inverter'] + ' Active power (kW)', config['status']]
+                      + ['{} PV{} input current (A)'.format(system, i) for i in range(1, 5)])]
+
+
+
+def columns(systems=systems):
+
+    """
+    Return the clean data columns used by the detector
+    """
+
+    return inverter_columns(systems) + list(dict.fromkeys(config[side] for config in systems.values()
+                                                          for side in ['front', 'back']))
+
+
+
+def runs(mask, samples=1):
+
+    """
+    Return the first and last positions of the runs of at least samples
+    consecutive True values of the boolean array mask
+    """
+
+    edges = np.diff(np.concatenate([[0], np.asarray(mask, dtype=np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    keep = ends - starts + 1 >= samples
+    return starts[keep], ends[keep]
+
+
+
+def _events(index, system, event, starts, ends, details):
+
+    """
+    Return the events table of the runs (starts, ends) of index
+    """
+
+    return pd.DataFrame({'system': system,
+                         'event': event,
+                         'start': index[starts],
+                         'end': index[ends],
+                         'duration (h)': sample_hours*(ends - starts + 1),
+                         'detail': details},
+                        columns=event_columns)
+
+
+
+def detect(data, systems=systems):
+
+    """
+    Return the events table of the clean data
+    """
+
+    # a regular index, so runs of samples are runs of time
+    data = data.asfreq('5min')
+    index = data.index
+    tables = []
+
+    # span of the available inverter data, missing AC power after it is data
+    # that has not arrived yet
+    available = np.flatnonzero(data[inverter_columns(systems)].notna().any(axis=1).to_numpy())
+    span = np.zeros(len(index), dtype=bool)
+    if len(available) > 0:
+        span[available[0]:available[-1] + 1] = True
+
+    for system, config in systems.items():
+        power = data[config['inverter'] + ' Active power (kW)'].to_numpy(dtype=float)
+        poa = (data[config['front']] + bifaciality*data[config['back']]).to_numpy(dtype=float)
+
+        # low or zero power during daylight
+        with np.errstate(invalid='ignore'):
+            daylight = poa > min_irradiance
+            low = daylight & (power < low_power_ratio*config['capacity']*poa/1000)
+        starts, ends = runs(low, min_samples['low power'])
+        details = ['mean AC power {:.2f} kW'.format(power[s:e+1].mean())
+                   for s, e in zip(starts, ends)]
+        tables.append(_events(index, system, 'low power', starts, ends, details))
+
+        # missing AC power during daylight, within the available inverter data
+        starts, ends = runs(daylight & np.isnan(power) & span, min_samples['no data'])
+        tables.append(_events(index, system, 'no data', starts, ends, 'no AC power data'))
+
+        # runs of an abnormal status
+        status = data[config['status']].dropna().astype(str).str.strip()
+        status = status[~status.str.lower().isin(missing_statuses)]
+        if len(status) > 0:
+            values = status.to_numpy()
+            change = np.flatnonzero(np.concatenate([[True], values[1:] != values[:-1]]))
+            positions = index.get_indexer(status.index)
+            starts = positions[change]
+            ends = np.concatenate([positions[change[1:] - 1], positions[-1:]])
+            previous = np.concatenate([[None], values[change][:-1]])
+            abnormal = ~status.iloc[change].str.lower().str.startswith(normal_statuses).to_numpy()
+            details = ['{} -> {}'.format(p, s) if p is not None else s
+                       for p, s in zip(previous[abnormal], values[change][abnormal])]
+            tables.append(_events(index, system, 'status', starts[abnormal], ends[abnormal], details))
+
+        # AC power at the AC limit of the inverter, or flat at a high level
+        # while the irradiance changes
+        with np.errstate(invalid='ignore'):
+            if config['ac_limit'] is not None:
+                clipped = power >= clipping_fraction*config['ac_limit']
+                starts, ends = runs(clipped, min_samples['clipping'])
+            else:
+                # a run of n flat changes is a run of n + 1 samples
+                flat = np.abs(np.diff(power, prepend=np.nan)) < flat_tolerance*power
+                poa_change = np.abs(np.diff(poa, prepend=np.nan)) > flat_tolerance*poa
+                clipped = flat & poa_change & (power > clipping_level*config['capacity'])
+                starts, ends = runs(clipped, min_samples['clipping'] - 1)
+                starts = starts - 1
+        details = ['AC power {:.2f} kW'.format(np.nanmean(power[s:e+1]))
+                   for s, e in zip(starts, ends)]
+        tables.append(_events(index, system, 'clipping', starts, ends, details))
+
+        # one string without current while the others produce
+        current = data[['{} PV{} input current (A)'.format(system, i)
+                        for i in range(1, 5)]].to_numpy(dtype=float)
+        with np.errstate(invalid='ignore'):
+            others = (np.nansum(current, axis=1, keepdims=True) - current) / (current.shape[1] - 1)
+            dropout = (current < dropout_current) & (others > min_current)
+        for i in range(current.shape[1]):
+            starts, ends = runs(dropout[:, i], min_samples['string dropout'])
+            tables.append(_events(index, system, 'string dropout', starts, ends,
+                                  '{} PV{}'.format(system, i + 1)))
+
+    events = pd.concat(tables, ignore_index=True)
+    return events.sort_values(['start', 'system', 'event'], ignore_index=True)
+
+
+
+def refresh(events_fn=events_fn, state_fn=state_fn, systems=systems, rebuild=False,
+            path=foulum_data.dataset_path):
+
+    """
+    Detect the events in the clean data after the last processed sample with
+    inverter data and update the events table. Events that may continue after it are removed
+    and detected again from their beginning. The clean data is read from
+    path. Returns the events table.
+    """
+
+    events = pd.DataFrame(columns=event_columns)
+    state = {'last': None}
+    if not rebuild and os.path.exists(events_fn) and os.path.exists(state_fn):
+        events = pd.read_parquet(events_fn)
+        with open(state_fn) as f:
+            state = json.load(f)
+
+    start = None
+    if state['last'] is not None:
+        # runs shorter than their minimum number of samples at the end of
+        # the processed data were not stored, they are looked for again
+        start = pd.Timestamp(state['last']) - (max(min_samples.values()) - 1)*pd.Timedelta('5min')
+        while True:
+            ongoing = events['end'] >= start
+            if not ongoing.any() or events.loc[ongoing, 'start'].min() >= start:
+                break
+            start = events.loc[ongoing, 'start'].min()
+        stored = events[events['end'] >= start]
+        events = events[events['end'] < start]
+
+    # one sample before start gives the previous status of a transition at start
+    context = None if start is None else start - pd.Timedelta('5min')
+    data = foulum_data.load(columns=columns(systems), start=context, path=path)
+
+    # clean_data.py stores a fixed time grid with empty rows for the data
+    # that has not arrived yet, and the monthly inverter workbooks arrive
+    # after the daily weather station files, the next refresh resumes after
+    # the last sample with inverter data
+    measured = data[inverter_columns(systems)].dropna(how='all').index
+    if len(measured) == 0 or (start is not None and measured[-1] < start):
+        return pd.concat([events, stored], ignore_index=True) if start is not None else events
+
+    new_events = detect(data, systems)
+    if start is not None:
+        new_events = new_events[new_events['end'] >= start]
+    events = pd.concat([events, new_events], ignore_index=True) if len(events) > 0 else new_events
+
+    for fn in [events_fn, state_fn]:
+        if os.path.dirname(fn):
+            os.makedirs(os.path.dirname(fn), exist_ok=True)
+    events.to_parquet(events_fn)
+    with open(state_fn, 'w') as f:
+        json.dump({'last': measured[-1].isoformat()}, f)
+    return events
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Detect faults and outages of the inverters')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='process the whole history instead of the new data')
+    args = parser.parse_args()
+
+    events = refresh(rebuild=args.rebuild)
+    print(events.groupby(['system', 'event'])['duration (h)'].agg(['count', 'sum']))
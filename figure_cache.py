@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+"""
+Skip rendering figures whose input data has not changed.
+
+A manifest 'resources/figure_manifest.json' maps every figure file to a key,
+the hash of the data plotted in it, the plotting parameters and the source of
+the script creating it. A figure is rendered again only if its file is
+missing or its key changed, e.g. because new inverter data arrived for that
+day or the script was edited.
+"""
+
+import hashlib
+import json
+import os
+import pandas as pd
+
+manifest_path = 'resources/figure_manifest.json'
+
+# manifest kept in memory, {manifest path: {'mtime', 'entries'}}
+_manifests = {}
+
+
+def data_key(data, params=None, script=None):
+
+    """
+    Return the hash of data (DataFrame or Series, values and index), the
+    plotting parameters params (any json serializable object) and the
+    source file script
+    """
+
+    h = hashlib.sha256()
+    names = list(data.columns) if isinstance(data, pd.DataFrame) else [data.name]
+    h.update(json.dumps([str(n) for n in names]).encode())
+    h.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    h.update(json.dumps(params, sort_keys=True, default=str).encode())
+    if script is not None:
+        with open(script, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+
+def up_to_date(fns, key, path=manifest_path):
+
+    """
+    True if all the figure files fns exist and were rendered from key
+    """
+
+    entries = read_manifest(path)
+    return all(os.path.exists(fn) and entries.get(fn) == key for fn in fns)
+
+
+
+def record(entries, path=manifest_path):
+
+    """
+    Store the keys of the rendered figures, entries = {figure file: key}
+    """
+
+    if len(entries) == 0:
+        return
+    manifest = dict(read_manifest(path))
+    manifest.update(entries)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=0, sort_keys=True)
+    os.replace(path + '.tmp', path)
+    _manifests[path] = {'mtime': os.path.getmtime(path), 'entries': manifest}
+
+
+
+def read_manifest(path=manifest_path):
+
+    """
+    Return the manifest {figure file: key}, empty if it does not exist
+    """
+
+    if not os.path.exists(path):
+        return {}
+    mtime = os.path.getmtime(path)
+    cached = _manifests.get(path)
+    if cached is None or cached['mtime'] != mtime:
+        with open(path) as f:
+            cached = {'mtime': mtime, 'entries': json.load(f)}
+        _manifests[path] = cached
+    return cached['entries']
@@ -2,67 +2,16 @@
 
 import pandas as pd
 import pvlib
-from pvlib.bifacial.pvfactors import pvfactors_timeseries
 import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
 import matplotlib.dates as mdates
 import numpy as np
-import warnings
-# supressing shapely warnings that occur on import of pvfactors
-warnings.filterwarnings(action='ignore', module='pvfactors')
+from bifacial_irradiance import calculate_irradiance_bifacial, sapm_daytime
+import foulum_data
+import pvgis_tmy
 plt.style.use(['seaborn-ticks','pv-textbook.mplstyle']) 
 
 
-def calculate_irradiance_bifacial(tilt, 
-                                  orientation, 
-                                  bifaciality, 
-                                  time_index,
-                                  dni,
-                                  dhi,
-                                  solar_azimuth,
-                                  solar_zenith,
-                                  pvrow_height, 
-                                  pvrow_width, 
-                                  albedo, 
-                                  gcr):
-    """
-    Calculate irradiance and effective irradiance on both planes of array (POA)
-    using measured weather data or TMY and the pvfactors engine for both front  
-    and rear-side effective irradiance
-    """
-    
-    surface_azimuth = orientation
-    surface_tilt = tilt
-    axis_azimuth = orientation+90
-    # axis_azimuth (float) – Azimuth angle of the rotation axis of the PV modules, 
-    # using pvlib’s convention (deg). This is supposed to be fixed for all timestamps.
-    # When modeling fixed-tilt arrays, set this value to be 90 degrees clockwise 
-    # from surface_azimuth.
-        
-    irrad = pvfactors_timeseries(solar_azimuth,
-                                 solar_zenith,
-                                 surface_azimuth,
-                                 surface_tilt,
-                                 axis_azimuth,
-                                 time_index,
-                                 dni,
-                                 dhi,
-                                 gcr,
-                                 pvrow_height,
-                                 pvrow_width,
-                                 albedo,
-                                 n_pvrows=4,
-                                 index_observed_pvrow=1)
-
-    # turn into pandas DataFrame
-    irrad = pd.concat(irrad, axis=1)
-
-    # using bifaciality factor and pvfactors results, create effective irradiance
-    effective_irrad_bifi = irrad['total_abs_front'] + (irrad['total_abs_back']
-                                                       * bifaciality)
-    return effective_irrad_bifi
-
-
 plt.figure(figsize=(16, 12))
 gs1 = gridspec.GridSpec(2, 2)
 gs1.update(wspace=0.21, hspace=0.25)
@@ -82,14 +31,27 @@ color_v='darkorange'
 %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
 """
 
-#load measured data
-data=pd.read_csv('resources/clean_data.csv',
-                 index_col=0)
-
-data.index = pd.to_datetime(data.index, utc=True) 
 tz='UTC'
 day='2023-05-12 00:00:00+00:00'
 
+#load measured data, one year from day
+columns = (['INV-1-TBF Total input power (kW)',
+            'INV-2-VBF Total input power (kW)',
+            'GHI_SPN1 (W.m-2)',
+            'DHI_SPN1 (W.m-2)',
+            'GHI (W.m-2)',
+            'wind velocity (m.s-1)',
+            'Ambient Temperature_2nd station (Deg C)',
+            'Reference Cell Tilted facing up (W.m-2)',
+            'Reference Cell Tilted facing down (W.m-2)',
+            'Reference Cell Vertical East (W.m-2)',
+            'Reference Cell Vertical West (W.m-2)']
+           + ['VBF PV{} input {}'.format(i, q) for i in range(1, 5) 
+              for q in ['current (A)', 'voltage (V)']])
+data = foulum_data.load(columns=columns,
+                        start=day, 
+                        end=pd.Timestamp(day) + pd.Timedelta(days=1))
+
 time_index = pd.date_range(start=day, 
                            periods=24*12*1, 
                            freq='5min',
@@ -124,25 +86,30 @@ ax0.text(0.05, 0.95, 'b)',
 %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
 """
 
-time_index_m = pd.date_range(start=day, 
-                             periods=24*12*365, 
-                             freq='5min',
-                             tz=tz)
-dc_energy_t_m = data['INV-1-TBF Total input power (kW)'][time_index_m].groupby(data['INV-1-TBF Total input power (kW)'][time_index_m].index.month).sum().reset_index()
-dc_energy_v_m =data['INV-2-VBF Total input power (kW)'][time_index_m].groupby(data['INV-1-TBF Total input power (kW)'][time_index_m].index.month).sum().reset_index()
+#365 days from the daily rollup table, grouped by month
+daily = foulum_data.load_rollup('daily',
+                                columns=['INV-1-TBF Total input energy (kWh)',
+                                         'INV-2-VBF Total input energy (kWh)',
+                                         'GHI_SPN1 (kWh.m-2)',
+                                         'GHI (kWh.m-2)'],
+                                start=day, 
+                                end=pd.Timestamp(day) + pd.Timedelta(days=364))
+daily_m = daily.groupby(daily.index.month)
+dc_energy_t_m = daily_m['INV-1-TBF Total input energy (kWh)'].sum().reset_index()
+dc_energy_v_m = daily_m['INV-2-VBF Total input energy (kWh)'].sum().reset_index()
 
 #estimate also annual GHI
-GHI_SPN1_m = data['GHI_SPN1 (W.m-2)'][time_index_m].groupby(data['GHI_SPN1 (W.m-2)'][time_index_m].index.month).sum().reset_index()
-GHI_m = data['GHI (W.m-2)'][time_index_m].groupby(data['GHI (W.m-2)'][time_index_m].index.month).sum().reset_index()
+GHI_SPN1_m = daily_m['GHI_SPN1 (kWh.m-2)'].sum().reset_index()
+GHI_m = daily_m['GHI (kWh.m-2)'].sum().reset_index()
 
 ax1.bar(dc_energy_t_m['index']-0.1,
-        (1/12)*dc_energy_t_m['INV-1-TBF Total input power (kW)']*(1/44.4), #5 minutes resolution, kW -> kWh/kWp  
+        dc_energy_t_m['INV-1-TBF Total input energy (kWh)']*(1/44.4), #kWh -> kWh/kWp  
         width=0.2,
         color=color_t,
         label='tilted measured')
 
 ax1.bar(dc_energy_v_m['index']+0.3,
-        (1/12)*dc_energy_v_m['INV-2-VBF Total input power (kW)']*(1/44.4), #5 minutes resolution, kW -> kWh/kWp  
+        dc_energy_v_m['INV-2-VBF Total input energy (kWh)']*(1/44.4), #kWh -> kWh/kWp  
         width=0.2,
         color=color_v,
         label='vertical measured')
@@ -202,7 +169,7 @@ albedo = 0.2
 
 # vertical installation
 tilt_v = 90
-orientation_v = -84
+orientation_v = foulum_data.orientations['VBF']
 pvrow_height_v = module_width + 0.2 + 0.1 #50 cm from the ground, 20 cm gap in the middle
 pvrow_width_v = module_width*2 + 0.2 + 0.2 #50 cm from the ground, 20 cm gap in the middle
 pitch_v = 11
@@ -210,7 +177,7 @@ gcr_v=module_width*2/pitch_v
 
 # tilted installation
 tilt_t = 25
-orientation_t = 184
+orientation_t = foulum_data.orientations['TBF']
 pvrow_height_t=module_length/2*np.sin(25/180*np.pi) + 0.8 #80cm from the ground to the lowest point of the panel
 pvrow_width_t = module_length
 pitch_t = 12 
@@ -256,7 +223,7 @@ am_abs = pvlib.atmosphere.get_absolute_airmass(airmass, pressure)
 
 
 # total effective irradiance can be estimated using pvfactors irradiance model
-# (function calculate_irradiance_bifacial)
+# (function calculate_irradiance_bifacial in bifacial_irradiance.py)
 
 # vertical installation
 effective_irrad_bifi_v=calculate_irradiance_bifacial(tilt_v , 
@@ -277,9 +244,10 @@ cell_temperature_v = pvlib.temperature.sapm_cell(effective_irrad_bifi_v,
                                                  wind_speed,
                                                  **temperature_model_parameters,)
 
-dc_power_v = factor*pvlib.pvsystem.sapm(effective_irrad_bifi_v, 
-                                         cell_temperature_v, 
-                                         module)
+dc_power_v = factor*sapm_daytime(effective_irrad_bifi_v, 
+                                  cell_temperature_v, 
+                                  module,
+                                  solar_zenith)
 ax0.plot(dc_power_v['p_mp']*(1/44.4), 
          color='orange',
          linestyle='--',
@@ -304,9 +272,10 @@ cell_temperature_t = pvlib.temperature.sapm_cell(effective_irrad_bifi_t,
                                                     wind_speed,
                                                     **temperature_model_parameters,)
 
-dc_power_t = factor*pvlib.pvsystem.sapm(effective_irrad_bifi_t, 
-                                         cell_temperature_t, 
-                                         module)
+dc_power_t = factor*sapm_daytime(effective_irrad_bifi_t, 
+                                  cell_temperature_t, 
+                                  module,
+                                  solar_zenith)
 
 ax0.plot(dc_power_t['p_mp']*(1/44.4), 
          color='dodgerblue',
@@ -323,10 +292,9 @@ ax0.legend(fontsize=22, bbox_to_anchor=(1.01, 0.5))
 %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
 """
 
-# We retrieve typical meteorological year (TMY) data from PVGIS.
-tmy, _, _, _ = pvlib.iotools.get_pvgis_tmy(latitude=lat, 
-                                           longitude=lon, 
-                                           map_variables=True)
+# We read typical meteorological year (TMY) data from PVGIS, downloaded
+# once with pvgis_tmy.py.
+tmy = pvgis_tmy.get_tmy(lat, lon)
 
 tmy.index = tmy.index.tz_convert(tz) # use local time
 solar_position = location.get_solarposition(times=tmy.index)
@@ -352,9 +320,10 @@ cell_temperature_v = pvlib.temperature.sapm_cell(effective_irrad_bifi_v,
                                                  tmy["temp_air"],
                                                  tmy["wind_speed"],
                                                  **temperature_model_parameters,)
-dc_power_v = pvlib.pvsystem.sapm(effective_irrad_bifi_v, 
-                                 cell_temperature_v, 
-                                 module)
+dc_power_v = sapm_daytime(effective_irrad_bifi_v, 
+                          cell_temperature_v, 
+                          module,
+                          solar_zenith)
 
 # tilted installation
 effective_irrad_bifi_t=calculate_irradiance_bifacial(tilt_t , 
@@ -375,9 +344,10 @@ cell_temperature_t = pvlib.temperature.sapm_cell(effective_irrad_bifi_t,
                                                  tmy["temp_air"],
                                                  tmy["wind_speed"],
                                                  **temperature_model_parameters,)
-dc_power_t = pvlib.pvsystem.sapm(effective_irrad_bifi_t, 
-                                 cell_temperature_t, 
-                                 module)
+dc_power_t = sapm_daytime(effective_irrad_bifi_t, 
+                          cell_temperature_t, 
+                          module,
+                          solar_zenith)
 
 dc_power_v_m = dc_power_v['p_mp'].groupby(dc_power_v['p_mp'].index.month).sum().reset_index()
 dc_power_t_m = dc_power_t['p_mp'].groupby(dc_power_t['p_mp'].index.month).sum().reset_index()
@@ -387,13 +357,13 @@ system_losses=0.16
 print("****** modelled yield tilted installation")
 print(((1-system_losses)*factor*dc_power_t_m['p_mp'].sum()/44.4).round())
 print("****** historial yield tilted installation")
-print(((1/12)*dc_energy_t_m['INV-1-TBF Total input power (kW)'].sum()/44.4).round())
+print((dc_energy_t_m['INV-1-TBF Total input energy (kWh)'].sum()/44.4).round())
 print("****** modelled annual GHI")
 print((tmy['ghi'].sum()/1000).round())
 print("****** historical annual GHI SPN1")
-print((0.001*1/12*GHI_SPN1_m['GHI_SPN1 (W.m-2)'].sum()).round())
+print((GHI_SPN1_m['GHI_SPN1 (kWh.m-2)'].sum()).round())
 print("****** historical annual GHI")
-print((0.001*1/12*GHI_m['GHI (W.m-2)'].sum()).round())
+print((GHI_m['GHI (kWh.m-2)'].sum()).round())
 
 ax1.bar(dc_power_t_m['time(UTC)']-0.3,
         (1-system_losses)*factor*dc_power_t_m['p_mp']*(1/44.4), #kW to MW (to MWh/kW)
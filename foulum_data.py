@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+
+"""
+Store and read the clean data as a columnar dataset partitioned by month.
+
+clean_data.py writes one compressed parquet file per month with a UTC
+datetime index in the folder 'resources/clean_data'. The analysis scripts
+use load() to read only the columns and the time range they need. 
+
+Decoded data is kept in memory, so a session running several analyses only 
+reads every column of every month from disk once. If the parquet dataset is 
+not available, the data is read from 'resources/clean_data.csv' (e.g. the 
+file downloaded from zenodo).
+
+clean_data.py also writes hourly, daily and monthly rollup tables (UTC 
+periods) with the energy (kWh) of the power columns, the irradiation 
+(kWh.m-2) of the irradiance columns, and their number of samples and 
+completeness. Analyses of energy or irradiation use load_rollup() instead of 
+aggregating the 5-minute data.
+"""
+
+import glob
+import os
+import pandas as pd
+
+dataset_path = 'resources/clean_data/'
+csv_path = 'resources/clean_data.csv'
+
+# columns stored as text, all the other columns are stored as float
+status_columns = ['TBF inverter status', 'VBF inverter status']
+
+# rollup tables, {name: pandas frequency of the periods}
+rollup_freqs = {'hourly': 'h', 'daily': 'D', 'monthly': 'MS'}
+
+# hours between samples of the columns that are not measured every 5 minutes
+sample_hours = {'GHI_2nd station (W.m-2)': 1.0}
+
+# azimuth (deg, pvlib convention) of the front side of the tilted (TBF) and 
+# vertical (VBF) installations
+orientations = {'TBF': 184, 'VBF': -84}
+
+# decoded data kept in memory, {file name: {'mtime', 'data', 'complete'}}
+_cache = {}
+
+
+def save(clean_data, path=dataset_path):
+
+    """
+    Store clean_data as one parquet file per month named
+    'clean_data_YYYY_MM.parquet'
+    """
+
+    clean_data = clean_data.copy()
+    clean_data.index = pd.DatetimeIndex(clean_data.index).tz_convert('UTC')
+    cols = [c for c in clean_data.columns if c not in status_columns]
+    clean_data[cols] = clean_data[cols].astype(float)
+
+    os.makedirs(path, exist_ok=True)
+    for fn in glob.glob(os.path.join(path, 'clean_data_*.parquet')):
+        os.remove(fn)
+    for (year, month), data in clean_data.groupby([clean_data.index.year,
+                                                   clean_data.index.month]):
+        fn = 'clean_data_{}_{}.parquet'.format(year, str(month).zfill(2))
+        data.to_parquet(os.path.join(path, fn), compression='zstd')
+
+
+
+def load(columns=None, start=None, end=None, path=dataset_path):
+
+    """
+    Read clean data between start and end (both included, UTC if no time
+    zone is given). Only the monthly files overlapping the time range and
+    the requested columns are read from disk, or taken from memory if they
+    were already read in this session.
+    """
+
+    columns = None if columns is None else list(columns)
+    start = None if start is None else _to_utc(start)
+    end = None if end is None else _to_utc(end)
+
+    all_fns = sorted(glob.glob(os.path.join(path, 'clean_data_*.parquet')))
+    fns = []
+    for fn in all_fns:
+        year, month = os.path.basename(fn)[11:18].split('_')
+        month_start = pd.Timestamp(int(year), int(month), 1, tz='UTC')
+        month_end = month_start + pd.offsets.MonthBegin(1)
+        if ((start is None or month_end > start)
+            and (end is None or month_start <= end)):
+            fns.append(fn)
+
+    if len(fns) > 0:
+        data = pd.concat([_read(fn, columns, _read_parquet) for fn in fns])
+    elif len(all_fns) == 0 and os.path.exists(csv_path):
+        data = _read(csv_path, columns, _read_csv)
+    else:
+        raise FileNotFoundError('no clean data in {} between {} and {}, '
+                                'run clean_data.py first'.format(path, start, end))
+
+    return data.loc[start:end].copy()
+
+
+
+def rollup(clean_data, freq):
+
+    """
+    Aggregate the power (kW) and irradiance (W.m-2) columns of clean_data in
+    periods of freq (e.g. 'h', 'D', 'MS'). For every column the table has the
+    energy (kWh) or irradiation (kWh.m-2), the number of samples and the
+    completeness, i.e. the fraction of the period covered by samples.
+    """
+
+    columns = [c for c in clean_data.columns 
+               if c.endswith(' (kW)') or c.endswith(' (W.m-2)')]
+    resampled = clean_data[columns].astype(float).resample(freq)
+    sums = resampled.sum()
+    counts = resampled.count()
+    hours = (sums.index + pd.tseries.frequencies.to_offset(freq) 
+             - sums.index) / pd.Timedelta(hours=1)
+
+    table = {}
+    for column in columns:
+        name, unit = column.rsplit(' (', 1)
+        dt = sample_hours.get(column, 5/60)
+        if unit == 'kW)':
+            table[name.replace(' power', ' energy') + ' (kWh)'] = dt*sums[column]
+        else:
+            table[name + ' (kWh.m-2)'] = 0.001*dt*sums[column]
+        table[name + ' samples'] = counts[column]
+        table[name + ' completeness'] = dt*counts[column]/hours
+    return pd.DataFrame(table, index=sums.index)
+
+
+
+def save_rollups(clean_data, path=dataset_path):
+
+    """
+    Store the rollup tables of clean_data as 'rollup_hourly.parquet', 
+    'rollup_daily.parquet' and 'rollup_monthly.parquet'
+    """
+
+    clean_data = clean_data.copy()
+    clean_data.index = pd.DatetimeIndex(clean_data.index).tz_convert('UTC')
+    os.makedirs(path, exist_ok=True)
+    for name, freq in rollup_freqs.items():
+        fn = os.path.join(path, 'rollup_{}.parquet'.format(name))
+        rollup(clean_data, freq).to_parquet(fn, compression='zstd')
+
+
+
+def load_rollup(name, columns=None, start=None, end=None, path=dataset_path):
+
+    """
+    Read the rollup table name ('hourly', 'daily' or 'monthly') for the 
+    periods starting between start and end (both included, UTC if no time 
+    zone is given). If the table was not stored, e.g. when only 
+    clean_data.csv is available, it is computed from the clean data.
+    """
+
+    columns = None if columns is None else list(columns)
+    start = None if start is None else _to_utc(start)
+    end = None if end is None else _to_utc(end)
+
+    fn = os.path.join(path, 'rollup_{}.parquet'.format(name))
+    if os.path.exists(fn):
+        data = _read(fn, columns, _read_parquet)
+    else:
+        data = rollup(load(path=path), rollup_freqs[name])
+        if columns is not None:
+            data = data[columns]
+
+    return data.loc[start:end].copy()
+
+
+
+def clear_cache():
+
+    """
+    Release the decoded data kept in memory
+    """
+
+    _cache.clear()
+
+
+
+def _read(fn, columns, reader):
+
+    """
+    Return columns of fn (all columns if None), only the columns that are 
+    not in memory yet are read with reader(fn, columns)
+    """
+
+    mtime = os.path.getmtime(fn)
+    entry = _cache.get(fn)
+    if entry is None or entry['mtime'] != mtime:
+        entry = {'mtime': mtime, 'data': None, 'complete': False}
+        _cache[fn] = entry
+
+    if columns is None:
+        if not entry['complete']:
+            entry['data'] = reader(fn, None)
+            entry['complete'] = True
+        return entry['data']
+
+    if entry['data'] is None:
+        entry['data'] = reader(fn, columns)
+    else:
+        missing = [c for c in columns if c not in entry['data'].columns]
+        if len(missing) > 0:
+            entry['data'] = entry['data'].join(reader(fn, missing))
+    return entry['data'][columns]
+
+
+
+def _read_parquet(fn, columns):
+
+    """
+    Read columns of a monthly parquet file
+    """
+
+    return pd.read_parquet(fn, columns=columns)
+
+
+
+def _read_csv(fn, columns):
+
+    """
+    Read columns of clean_data.csv and parse its text index as UTC
+    """
+
+    header = pd.read_csv(fn, nrows=0).columns
+    data = pd.read_csv(fn, 
+                       index_col=0,
+                       usecols=None if columns is None else [header[0]] + columns)
+    data.index = pd.to_datetime(data.index, utc=True)
+    return data
+
+
+
+def _to_utc(timestamp):
+
+    """
+    Return timestamp in UTC, naive timestamps are assumed to be in UTC
+    """
+
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tzinfo is None:
+        return timestamp.tz_localize('UTC')
+    return timestamp.tz_convert('UTC')
@@ -7,55 +7,39 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec 
-
-data=pd.read_csv('resources/clean_data.csv',
-                 index_col=0)
-
-data.index = pd.to_datetime(data.index, utc=True)
+import foulum_data
+import performance_ratio
 
 import numpy as np
 
 
-# Monthly energy (MWh): sum 5-min power readings × (5/60 h) / 1000
-monthly = data[['INV-1-TBF Active power (kW)',
-                'INV-2-VBF Active power (kW)']].resample('ME').sum() * (5/60) / 1000
+# Monthly energy (MWh) from the monthly rollup table written by clean_data.py
+monthly = foulum_data.load_rollup('monthly',
+                                  columns=['INV-1-TBF Active energy (kWh)',
+                                           'INV-2-VBF Active energy (kWh)']) / 1000
 monthly.index = monthly.index.strftime('%b %Y')
 
 x = np.arange(len(monthly))
 width = 0.35
 
 fig, ax = plt.subplots(figsize=(12, 6))
-ax.bar(x - width/2, monthly['INV-1-TBF Active power (kW)'],
+ax.bar(x - width/2, monthly['INV-1-TBF Active energy (kWh)'],
        width, label='INV-1-TBF (25° tilt)', color='#5FA1D8')
-ax.bar(x + width/2, monthly['INV-2-VBF Active power (kW)'],
+ax.bar(x + width/2, monthly['INV-2-VBF Active energy (kWh)'],
        width, label='INV-2-VBF (vertical west)', color='#B31F20')
 
 ax.set_xlabel('Month')
 ax.set_ylabel('AC energy generation (MWh)')
 ax.set_xticks(x)
 ax.set_xticklabels(monthly.index, rotation=45, ha='right')
-# Load PVGIS time series (1 kWp, Foulum coordinates)
-def load_pvgis(path):
-    df = pd.read_csv(path, skiprows=10, engine='python')
-    df.index = pd.to_datetime(df['time'], format='%Y%m%d:%H%M', errors='coerce')
-    df = df[df.index.notna()]
-    return df['P'].astype(float)  # W per 1 kWp
-
-pvgis_tbf      = load_pvgis('data/PVGIS/Timeseries_56.495_9.571_SA3_1kWp_crystSi_14_25deg_0deg_2005_2023.csv')
-pvgis_vbf_west = load_pvgis('data/PVGIS/Timeseries_56.495_9.571_SA3_1kWp_crystSi_14_90deg_90deg_2005_2023.csv')
-pvgis_vbf_east = load_pvgis('data/PVGIS/Timeseries_56.495_9.571_SA3_1kWp_crystSi_14_90deg_-90deg_2005_2023.csv')
-
-# Average monthly energy per 1 kWp across TMY years (kWh)
-def monthly_tmy(series):
-    monthly_kwh = series.resample('ME').sum() / 1000
-    return monthly_kwh.groupby(monthly_kwh.index.month).mean()
-
-BIFACIALITY = 0.85
-
-# Scale to 44.4 kWp, convert to MWh
-tmy_tbf = monthly_tmy(pvgis_tbf) * 44.4 / 1000
+# Expected monthly energy per 1 kWp across the PVGIS years (kWh), for the
+# capacity and bifaciality configured in performance_ratio.py
+expected = performance_ratio.expected_monthly()
+
+# Scale to the capacity, convert to MWh
+tmy_tbf = expected['INV-1-TBF'] * performance_ratio.inverters['INV-1-TBF']['capacity'] / 1000
 # VBF: west-facing front + bifaciality × east-facing back
-tmy_vbf = (monthly_tmy(pvgis_vbf_west) + BIFACIALITY * monthly_tmy(pvgis_vbf_east)) * 44.4 / 1000
+tmy_vbf = expected['INV-2-VBF'] * performance_ratio.inverters['INV-2-VBF']['capacity'] / 1000
 
 # Map TMY calendar months to the actual x-axis positions
 month_nums = pd.to_datetime(monthly.index, format='%b %Y').month
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+"""
+Performance ratio, specific yield and deviation from the expected yield of
+the inverters, for daily, monthly and annual (UTC) periods.
+
+Every inverter in inverters has its capacity (kWp), the reference cells
+measuring the front and back irradiance of its PV modules and the PVGIS
+time series (1 kWp, see pvgis_timeseries.py) of the orientation of its
+front and back side, which give its expected yield. The bifaciality weighs
+the back irradiance and the back orientation.
+
+performance() takes the AC power and reference cells of all inverters from
+the 5-minute clean data in one pass and sums them per day. The specific
+yield and the deviation from the expected yield use all the AC power
+samples, the expected yield is scaled by the coverage of the AC power data.
+The performance ratio only uses the samples where both power and
+irradiance are measured. Monthly and annual values are sums of the daily
+ones. The results table has one row per
+(granularity, inverter, period) and is stored in
+'resources/performance_ratio.parquet', e.g.
+
+    python performance_ratio.py --bifaciality 0.8 --capacity INV-2-VBF=44.4
+
+Dashboards read it with load_results() instead of recomputing it from the
+5-minute data.
+"""
+
+import argparse
+import os
+import pandas as pd
+import foulum_data
+import pvgis_timeseries
+
+results_fn = 'resources/performance_ratio.parquet'
+
+# PVGIS time series (1 kWp, Foulum coordinates) of every orientation
+pvgis_files = {'TBF': 'data/PVGIS/Timeseries_56.495_9.571_SA3_1kWp_crystSi_14_25deg_0deg_2005_2023.csv',
+               'VBF west': 'data/PVGIS/Timeseries_56.495_9.571_SA3_1kWp_crystSi_14_90deg_90deg_2005_2023.csv',
+               'VBF east': 'data/PVGIS/Timeseries_56.495_9.571_SA3_1kWp_crystSi_14_90deg_-90deg_2005_2023.csv'}
+
+bifaciality = 0.85
+
+# capacity (kWp), front and back reference cells and PVGIS orientations of
+# the front and back side of every inverter
+inverters = {'INV-1-TBF': {'capacity': 44.4,
+                           'front': 'Reference Cell Tilted facing up (W.m-2)',
+                           'back': 'Reference Cell Tilted facing down (W.m-2)',
+                           'pvgis_front': 'TBF',
+                           'pvgis_back': None},
+             'INV-2-VBF': {'capacity': 44.4,
+                           'front': 'Reference Cell Vertical West (W.m-2)',
+                           'back': 'Reference Cell Vertical East (W.m-2)',
+                           'pvgis_front': 'VBF west',
+                           'pvgis_back': 'VBF east'}}
+
+# results tables, {name: pandas frequency of the periods}
+granularities = {'daily': 'D', 'monthly': 'MS', 'annual': 'YS'}
+
+# hours between samples of the clean data
+sample_hours = 5/60
+
+
+def expected_monthly(inverters=inverters, bifaciality=bifaciality, pvgis_files=pvgis_files):
+
+    """
+    Return the expected specific yield (kWh/kWp) of every calendar month,
+    one column per inverter, from the monthly climatology of the PVGIS time
+    series
+    """
+
+    tmy = pvgis_timeseries.monthly_tmy(pvgis_files)
+    expected = {}
+    for name, inverter in inverters.items():
+        expected[name] = tmy[inverter['pvgis_front']]
+        if inverter['pvgis_back'] is not None:
+            expected[name] = expected[name] + bifaciality*tmy[inverter['pvgis_back']]
+    return pd.DataFrame(expected)
+
+
+
+def performance(data, inverters=inverters, bifaciality=bifaciality, expected=None):
+
+    """
+    Return the results table of the inverters for the clean data, with
+    columns 'granularity', 'inverter', 'period' (UTC start), 'AC energy
+    (kWh)', 'POA irradiation (kWh.m-2)' (front + bifaciality*back),
+    'completeness' (of the AC power data), 'specific yield (kWh/kWp)',
+    'reference yield (h)', 'performance ratio' (of the samples where both
+    power and irradiance are measured) and, if the monthly expected
+    specific yield (see expected_monthly()) is given, 'expected specific
+    yield (kWh/kWp)' and 'deviation from expected (%)'.
+    """
+
+    columns = {}
+    for name, inverter in inverters.items():
+        power = data[name + ' Active power (kW)'].astype(float)
+        poa = data[inverter['front']] + bifaciality*data[inverter['back']]
+        valid = power.notna() & poa.notna()
+        columns[(name, 'AC energy (kWh)')] = sample_hours*power
+        columns[(name, 'POA irradiation (kWh.m-2)')] = 0.001*sample_hours*poa
+        columns[(name, 'samples')] = power.notna().astype(float)
+        # energy and irradiation of the performance ratio
+        columns[(name, 'valid energy')] = sample_hours*power.where(valid)
+        columns[(name, 'valid irradiation')] = 0.001*sample_hours*poa.where(valid)
+    daily = pd.DataFrame(columns, index=data.index).resample('D').sum(min_count=1)
+
+    if expected is not None:
+        # expected energy of a day is the expected energy of its month
+        # shared by the days of the month, scaled by the coverage of the
+        # AC power data of the day
+        days = daily.index.days_in_month.to_numpy()
+        for name in inverters:
+            expected_daily = pd.Series(expected[name].loc[daily.index.month].to_numpy() / days,
+                                       index=daily.index)
+            coverage = sample_hours*daily[(name, 'samples')]/24
+            daily[(name, 'expected')] = (coverage*expected_daily).where(daily[(name, 'samples')] > 0)
+
+    tables = []
+    for granularity, freq in granularities.items():
+        sums = daily if freq == 'D' else daily.resample(freq).sum(min_count=1)
+        hours = (sums.index + pd.tseries.frequencies.to_offset(freq)
+                 - sums.index) / pd.Timedelta(hours=1)
+        for name, inverter in inverters.items():
+            table = pd.DataFrame({'granularity': granularity,
+                                  'inverter': name,
+                                  'period': sums.index,
+                                  'AC energy (kWh)': sums[(name, 'AC energy (kWh)')].to_numpy(),
+                                  'POA irradiation (kWh.m-2)': sums[(name, 'POA irradiation (kWh.m-2)')].to_numpy(),
+                                  'completeness': (sample_hours*sums[(name, 'samples')]/hours).to_numpy()})
+            table['specific yield (kWh/kWp)'] = table['AC energy (kWh)']/inverter['capacity']
+            table['reference yield (h)'] = table['POA irradiation (kWh.m-2)']
+            valid_irradiation = sums[(name, 'valid irradiation')]
+            table['performance ratio'] = (sums[(name, 'valid energy')]/inverter['capacity']
+                                          / valid_irradiation.where(valid_irradiation > 0)).to_numpy()
+            if expected is not None:
+                table['expected specific yield (kWh/kWp)'] = sums[(name, 'expected')].to_numpy()
+                table['deviation from expected (%)'] = 100*(table['specific yield (kWh/kWp)']
+                                                            / table['expected specific yield (kWh/kWp)']
+                                                            - 1)
+            tables.append(table)
+    return pd.concat(tables, ignore_index=True)
+
+
+
+def load_results(granularity=None, inverters=None, start=None, end=None, fn=results_fn):
+
+    """
+    Read the rows of the results table of granularity ('daily', 'monthly' or
+    'annual') and inverters (lists of names), with periods starting between
+    start and end (both included, UTC if no time zone is given). None
+    selects all of them.
+    """
+
+    filters = []
+    if granularity is not None:
+        filters.append(('granularity', '==', granularity))
+    if inverters is not None:
+        filters.append(('inverter', 'in', list(inverters)))
+    for operator, timestamp in [('>=', start), ('<=', end)]:
+        if timestamp is not None:
+            timestamp = pd.Timestamp(timestamp)
+            if timestamp.tz is None:
+                timestamp = timestamp.tz_localize('UTC')
+            filters.append(('period', operator, timestamp))
+    return pd.read_parquet(fn, filters=filters or None)
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Performance ratio and specific yield of the inverters')
+    parser.add_argument('--bifaciality', type=float, default=bifaciality)
+    parser.add_argument('--capacity', nargs='+', default=[],
+                        help='capacity of inverters, name=kWp')
+    parser.add_argument('--output', default=results_fn)
+    args = parser.parse_args()
+
+    for specification in args.capacity:
+        name, capacity = specification.split('=')
+        inverters[name]['capacity'] = float(capacity)
+
+    columns = [name + ' Active power (kW)' for name in inverters]
+    columns += list(dict.fromkeys(inverter[side] for inverter in inverters.values()
+                                  for side in ['front', 'back']))
+    data = foulum_data.load(columns=columns)
+
+    expected = None
+    if all(os.path.exists(fn) for fn in pvgis_files.values()):
+        expected = expected_monthly(bifaciality=args.bifaciality)
+    results = performance(data, bifaciality=args.bifaciality, expected=expected)
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    results.to_parquet(args.output, compression='zstd')
+    print(results[results['granularity'] == 'annual'].round(3).to_string(index=False))
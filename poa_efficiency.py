@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+"""
+Efficiency of the tilted and vertical systems over the whole clean data.
+
+The efficiency of a system is its DC power divided by the bifacial plane of
+array (POA) irradiance measured by its reference cells (front +
+bifaciality*back) on the area of its PV modules. It is calculated for every
+timestamp at once.
+
+The efficiency is only representative in clear-sky windows, which are
+detected automatically for every system: the sun is high enough above the
+horizon and close enough to the normal of the front side, the front
+irradiance is high, GHI is close to the clear-sky GHI, and the front
+irradiance and GHI are smooth (no cloud transients) around the timestamp.
+
+daily_statistics() summarises the efficiency in the valid windows of every
+day, and the table is stored in 'resources/daily_efficiency.parquet', e.g.
+
+    python poa_efficiency.py --start 2023-01-01 --min-irradiance 300
+"""
+
+import argparse
+import os
+import pandas as pd
+import pvlib
+import foulum_data
+
+results_fn = 'resources/daily_efficiency.parquet'
+
+latitude, longitude = 56.497, 9.584
+
+area = 80*2.280*1.134 #80 PV panels per inverter
+bifaciality = 0.8
+
+# DC power, front and back reference cells and orientation of the front side
+# of every system
+systems = {'INV-1-TBF': {'power': 'INV-1-TBF Total input power (kW)',
+                         'front': 'Reference Cell Tilted facing up (W.m-2)',
+                         'back': 'Reference Cell Tilted facing down (W.m-2)',
+                         'tilt': 25,
+                         'azimuth': foulum_data.orientations['TBF']},
+           'INV-2-VBF': {'power': 'INV-2-VBF Total input power (kW)',
+                         'front': 'Reference Cell Vertical West (W.m-2)',
+                         'back': 'Reference Cell Vertical East (W.m-2)',
+                         'tilt': 90,
+                         'azimuth': foulum_data.orientations['VBF']}}
+
+# criteria of the clear-sky windows
+window_criteria = {'min_elevation': 15,         # sun elevation (deg)
+                   'max_aoi': 60,               # angle of incidence on the front (deg)
+                   'min_irradiance': 200,       # front irradiance (W.m-2)
+                   'min_clear_sky_index': 0.7,  # GHI / clear-sky GHI
+                   'stability_window': '30min',
+                   'max_variation': 0.02}       # sample-to-sample variation in the window
+
+
+def columns(systems=systems):
+
+    """
+    Return the clean data columns used by the systems
+    """
+
+    return (['GHI (W.m-2)']
+            + [system[c] for system in systems.values() for c in ['power', 'front', 'back']])
+
+
+
+def efficiency(data, systems=systems, area=area, bifaciality=bifaciality):
+
+    """
+    Return the efficiency of every system for every timestamp of data, one
+    column 'Efficiency <system>' per system
+    """
+
+    result = {}
+    for name, system in systems.items():
+        irradiance = data[system['front']] + bifaciality*data[system['back']]
+        result['Efficiency ' + name] = ((1000/area) * data[system['power']]
+                                        / irradiance.where(irradiance > 0))
+    return pd.DataFrame(result, index=data.index)
+
+
+
+def stable(irradiance, window, max_variation):
+
+    """
+    Return True for the timestamps where the irradiance is smooth in the
+    centered time window: every sample deviates less than max_variation
+    (relative) from the mean of the previous and next samples, so clear-sky
+    ramps are stable but cloud transients are not, and no sample is missing
+    """
+
+    step = pd.Timedelta('5min')
+    neighbours = ((irradiance.shift(freq=step) + irradiance.shift(freq=-step)) / 2).reindex(irradiance.index)
+    deviation = (irradiance - neighbours).abs() / irradiance.where(irradiance > 0)
+    rolling = deviation.rolling(window, center=True)
+    return ((rolling.max() < max_variation)
+            & (rolling.count() >= pd.Timedelta(window) / step - 1))
+
+
+
+def clear_sky_windows(data, systems=systems, criteria=window_criteria,
+                      solar_position=None):
+
+    """
+    Return True for the timestamps of data in a clear-sky window of every
+    system, one column per system
+    """
+
+    location = pvlib.location.Location(latitude, longitude)
+    if solar_position is None:
+        solar_position = location.get_solarposition(data.index)
+    clear_sky = location.get_clearsky(data.index, solar_position=solar_position)
+    ghi_clear = ((data['GHI (W.m-2)'] > criteria['min_clear_sky_index']*clear_sky['ghi'])
+                 & stable(data['GHI (W.m-2)'], criteria['stability_window'],
+                          criteria['max_variation']))
+    sun_high = solar_position['apparent_elevation'] > criteria['min_elevation']
+
+    windows = {}
+    for name, system in systems.items():
+        aoi = pvlib.irradiance.aoi(system['tilt'], system['azimuth'],
+                                   solar_position['apparent_zenith'],
+                                   solar_position['azimuth'])
+        windows[name] = (sun_high
+                         & (aoi < criteria['max_aoi'])
+                         & (data[system['front']] > criteria['min_irradiance'])
+                         & (data[system['power']] > 0)
+                         & ghi_clear
+                         & stable(data[system['front']], criteria['stability_window'],
+                                  criteria['max_variation']))
+    return pd.DataFrame(windows, index=data.index)
+
+
+
+def daily_statistics(data, systems=systems, area=area, bifaciality=bifaciality,
+                     criteria=window_criteria):
+
+    """
+    Return the efficiency statistics of every (UTC) day in the clear-sky
+    windows, for every system the columns '<system> samples', '<system>
+    efficiency mean', 'median', 'std', 'p10', 'p90' and '<system> weighted
+    efficiency' (sum of DC power / sum of irradiance of the valid samples)
+    """
+
+    eff = efficiency(data, systems, area, bifaciality)
+    windows = clear_sky_windows(data, systems, criteria)
+
+    table = {}
+    for name, system in systems.items():
+        valid = windows[name] & eff['Efficiency ' + name].notna()
+        daily = eff['Efficiency ' + name].where(valid).resample('D')
+        table[name + ' samples'] = daily.count()
+        table[name + ' efficiency mean'] = daily.mean()
+        table[name + ' efficiency median'] = daily.median()
+        table[name + ' efficiency std'] = daily.std()
+        table[name + ' efficiency p10'] = daily.quantile(0.1)
+        table[name + ' efficiency p90'] = daily.quantile(0.9)
+        irradiance = data[system['front']] + bifaciality*data[system['back']]
+        power = data[system['power']].where(valid).resample('D').sum()
+        table[name + ' weighted efficiency'] = ((1000/area) * power
+                                                / irradiance.where(valid).resample('D').sum())
+    return pd.DataFrame(table)
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Daily efficiency of the systems in clear-sky windows')
+    parser.add_argument('--start', help='first day (UTC), default first day of the data')
+    parser.add_argument('--end', help='last day (UTC), default last day of the data')
+    parser.add_argument('--bifaciality', type=float, default=bifaciality)
+    parser.add_argument('--min-elevation', type=float, default=window_criteria['min_elevation'])
+    parser.add_argument('--max-aoi', type=float, default=window_criteria['max_aoi'])
+    parser.add_argument('--min-irradiance', type=float, default=window_criteria['min_irradiance'])
+    parser.add_argument('--min-clear-sky-index', type=float,
+                        default=window_criteria['min_clear_sky_index'])
+    parser.add_argument('--max-variation', type=float, default=window_criteria['max_variation'])
+    parser.add_argument('--output', default=results_fn)
+    args = parser.parse_args()
+
+    criteria = dict(window_criteria,
+                    min_elevation=args.min_elevation,
+                    max_aoi=args.max_aoi,
+                    min_irradiance=args.min_irradiance,
+                    min_clear_sky_index=args.min_clear_sky_index,
+                    max_variation=args.max_variation)
+    end = None if args.end is None else pd.Timestamp(args.end) + pd.Timedelta('23:55:00')
+    data = foulum_data.load(columns=columns(), start=args.start, end=end)
+
+    statistics = daily_statistics(data, bifaciality=args.bifaciality, criteria=criteria)
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    statistics.to_parquet(args.output, compression='zstd')
+    print(statistics.filter(like='median').describe().round(4))
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+"""
+Read the hourly PVGIS time series of 1 kWp PV systems in 'data/PVGIS/'.
+
+The CSV files downloaded from PVGIS have a header with the site and system
+description, the table of hourly values starting with the line 'time,P,...'
+and a footer with the description of the variables after a blank line.
+read_timeseries() locates the table and parses it with the C engine of
+pandas and the fixed timestamp format of PVGIS ('%Y%m%d:%H%M', UTC).
+
+Parsed time series and their monthly climatology are stored in
+'resources/pvgis_cache/' as parquet files together with the size and
+modification time of the CSV files, and reused as long as the files have
+not changed, e.g.
+
+    expected = pvgis_timeseries.monthly_tmy({'TBF': fn_25deg, 'VBF west': fn_90deg})
+
+returns the average energy (kWh per kWp) of every calendar month for any
+number of orientations.
+"""
+
+import io
+import json
+import hashlib
+import os
+import re
+import pandas as pd
+
+cache_path = 'resources/pvgis_cache/'
+
+time_format = '%Y%m%d:%H%M'
+
+
+def read_timeseries(fn):
+
+    """
+    Parse the table of hourly values of the PVGIS time series file fn. Returns
+    the PVGIS variables ('P' (W), 'G(i)' (W.m-2), 'H_sun', 'T2m', 'WS10m',
+    'Int') with a UTC datetime index.
+    """
+
+    with open(fn, 'rb') as f:
+        content = f.read()
+
+    # the table starts with the line of column names and ends at the first
+    # blank line, followed by the footer
+    header = re.search(rb'^time,', content, re.MULTILINE)
+    if header is None:
+        raise ValueError('{} is not a PVGIS time series file'.format(fn))
+    footer = re.search(rb'\r?\n[ \t]*(\r?\n|$)', content[header.start():])
+    end = len(content) if footer is None else header.start() + footer.start()
+
+    data = pd.read_csv(io.BytesIO(content[header.start():end]),
+                       engine='c',
+                       dtype={'time': str})
+    data.index = pd.to_datetime(data.pop('time'), format=time_format, utc=True)
+    data.index.name = None
+    return data.astype(float)
+
+
+
+def load(fn, cache_path=cache_path):
+
+    """
+    Return read_timeseries(fn), from the copy in cache_path if fn has not
+    changed since it was parsed
+    """
+
+    name = os.path.splitext(os.path.basename(fn))[0]
+    fn_cache = os.path.join(cache_path, name + '.parquet')
+    fn_signature = os.path.join(cache_path, name + '.json')
+
+    if os.path.exists(fn_cache) and os.path.exists(fn_signature):
+        with open(fn_signature) as f:
+            if json.load(f) == file_signature(fn):
+                return pd.read_parquet(fn_cache)
+
+    data = read_timeseries(fn)
+    os.makedirs(cache_path, exist_ok=True)
+    data.to_parquet(fn_cache)
+    with open(fn_signature, 'w') as f:
+        json.dump(file_signature(fn), f)
+    return data
+
+
+
+def monthly_tmy(fns, cache_path=cache_path):
+
+    """
+    Return the average energy (kWh per kWp) of every calendar month of the
+    PVGIS time series fns = {name: file name}, one column per name. The
+    table is stored in cache_path and reused as long as the files have not
+    changed.
+    """
+
+    signatures = {name: file_signature(fn) for name, fn in fns.items()}
+    key = hashlib.sha1(json.dumps(signatures, sort_keys=True).encode())
+    fn_cache = os.path.join(cache_path, 'monthly_tmy_{}.parquet'.format(key.hexdigest()[:10]))
+    if os.path.exists(fn_cache):
+        return pd.read_parquet(fn_cache)
+
+    power = pd.DataFrame({name: load(fn, cache_path)['P'] for name, fn in fns.items()})
+    monthly_kwh = power.resample('MS').sum() / 1000
+    climatology = monthly_kwh.groupby(monthly_kwh.index.month).mean()
+    climatology.index.name = 'month'
+
+    os.makedirs(cache_path, exist_ok=True)
+    climatology.to_parquet(fn_cache)
+    return climatology
+
+
+
+def file_signature(fn):
+
+    """
+    Return path, size and modification time of fn
+    """
+
+    stat = os.stat(fn)
+    return {'path': os.path.abspath(fn),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime}
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+"""
+Typical meteorological year (TMY) from PVGIS, read from a local cache.
+
+get_tmy() returns the TMY stored in 'data/PVGIS/' for the coordinates and
+the request parameters (usehorizon, startyear, endyear, ...) of
+pvlib.iotools.get_pvgis_tmy(), with the variable names of pvlib and a UTC
+time index. Every TMY is one CSV file, named by the coordinates and a hash
+of the request parameters, with the PVGIS metadata in a JSON file next to it.
+
+The TMYs are downloaded once with the prefetch command, e.g.
+
+    python pvgis_tmy.py                        # Foulum
+    python pvgis_tmy.py --site 55.7,12.5 --site 57.0,9.9 --startyear 2010
+
+so the model scripts run offline. The cache folder can be copied to
+computers without internet access. A TMY that is not in the cache is
+downloaded on first use, unless download=False.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pandas as pd
+import pvlib
+
+tmy_path = 'data/PVGIS/'
+
+# location of the pilot plant in Foulum, default of the prefetch command
+foulum_site = (56.497, 9.584)
+
+
+def get_tmy(latitude, longitude, path=tmy_path, download=True, **request):
+
+    """
+    Return the PVGIS TMY at latitude, longitude read from the cache path.
+    request are the keyword arguments of pvlib.iotools.get_pvgis_tmy(). If
+    the TMY is not in the cache it is downloaded and stored, or
+    FileNotFoundError is raised if download=False.
+    """
+
+    fn = tmy_fn(latitude, longitude, path, **request)
+    if not os.path.exists(fn):
+        if not download:
+            raise FileNotFoundError('{} not found, download the TMY first with python '
+                                    'pvgis_tmy.py --site {},{}'.format(fn, latitude, longitude))
+        prefetch(latitude, longitude, path=path, **request)
+
+    tmy = pd.read_csv(fn, index_col=0, float_precision='round_trip')
+    tmy.index = pd.to_datetime(tmy.index, utc=True)
+    return tmy
+
+
+
+def prefetch(latitude, longitude, path=tmy_path, **request):
+
+    """
+    Download the PVGIS TMY at latitude, longitude and store it in the cache
+    path, returns the file name
+    """
+
+    # get_pvgis_tmy() returns the data first and the metadata last (4 values
+    # in older versions of pvlib, 2 in recent ones)
+    result = pvlib.iotools.get_pvgis_tmy(latitude=latitude,
+                                         longitude=longitude,
+                                         map_variables=True,
+                                         **request)
+    tmy, metadata = result[0], result[-1]
+    tmy.index = tmy.index.tz_convert('UTC')
+
+    fn = tmy_fn(latitude, longitude, path, **request)
+    os.makedirs(path, exist_ok=True)
+    # write to a temporary file first, so an interrupted download never
+    # leaves an incomplete file in the cache
+    tmy.to_csv(fn + '.tmp')
+    os.replace(fn + '.tmp', fn)
+    with open(fn.replace('.csv', '.json'), 'w') as f:
+        json.dump({'latitude': latitude,
+                   'longitude': longitude,
+                   'request': request,
+                   'downloaded': pd.Timestamp.now(tz='UTC').isoformat(),
+                   'pvlib': pvlib.__version__,
+                   'metadata': metadata}, f, indent=1, default=str)
+    return fn
+
+
+
+def tmy_fn(latitude, longitude, path=tmy_path, **request):
+
+    """
+    Return the cache file name of the TMY at latitude, longitude for the
+    request parameters
+    """
+
+    key = hashlib.sha1(json.dumps(request, sort_keys=True, default=str).encode())
+    return os.path.join(path, 'tmy_{:.4f}_{:.4f}_{}.csv'.format(float(latitude),
+                                                                float(longitude),
+                                                                key.hexdigest()[:10]))
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Download PVGIS TMYs to ' + tmy_path)
+    parser.add_argument('--site', action='append', default=[],
+                        help='latitude,longitude (default Foulum), may be repeated')
+    parser.add_argument('--startyear', type=int, help='first year of the TMY period')
+    parser.add_argument('--endyear', type=int, help='last year of the TMY period')
+    parser.add_argument('--no-horizon', action='store_true',
+                        help='do not include the effect of the terrain horizon')
+    parser.add_argument('--force', action='store_true',
+                        help='download again the TMYs already in the cache')
+    args = parser.parse_args()
+
+    request = {}
+    if args.startyear is not None:
+        request['startyear'] = args.startyear
+    if args.endyear is not None:
+        request['endyear'] = args.endyear
+    if args.no_horizon:
+        request['usehorizon'] = False
+
+    sites = [tuple(float(v) for v in site.split(',')) for site in args.site] or [foulum_site]
+    for latitude, longitude in sites:
+        fn = tmy_fn(latitude, longitude, **request)
+        if os.path.exists(fn) and not args.force:
+            print('in cache', fn)
+        else:
+            print('downloaded', prefetch(latitude, longitude, **request))
@@ -9,6 +9,7 @@ import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec 
 import numpy as np  
 import math
+import foulum_data
 
 start_date = '2022-12-01 00:00:00'
 start_date2 = '2023-06-01 00:00:00' 
@@ -17,10 +18,16 @@ end_date = '2023-11-30 23:55:00'
 
 tz = 'UTC' 
 
-data=pd.read_csv('resources/clean_data.csv',
-                 index_col=0)
-
-data.index = pd.to_datetime(data.index, utc=True) 
+data = foulum_data.load(columns=['GHI (W.m-2)', 
+                                 'GHI_SPN1 (W.m-2)', 
+                                 'GHI_2nd station (W.m-2)'],
+                        start=start_date, 
+                        end=end_date)
+hourly = foulum_data.load_rollup('hourly',
+                                 columns=['GHI (kWh.m-2)', 'GHI samples',
+                                          'GHI_SPN1 (kWh.m-2)', 'GHI_SPN1 samples'],
+                                 start=start_date, 
+                                 end=end_date)
 
 time_index = pd.date_range(start=start_date, 
                            end=end_date, 
@@ -68,7 +75,10 @@ for i, pair in enumerate(pairs):
     if i==0:     
         series_a = data[pair[0]][time]       
     else:
-        series_a = data[pair[0]].resample('H').mean()[time]
+        #hourly mean irradiance from the hourly rollup table
+        name = pair[0].rsplit(' (', 1)[0]
+        series_a = (1000*hourly[name + ' (kWh.m-2)'] 
+                    / (hourly[name + ' samples']*5/60))[time]
     
     series_b = data[pair[1]][time] 
     
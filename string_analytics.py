@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+"""
+Power, mismatch and imbalance of the 8 monitored strings (4 MPPT inputs of
+the tilted TBF and of the vertical VBF inverter) over the whole clean data.
+
+The power of every string is the product of its input current and voltage,
+calculated for the 8 strings at once. The mismatch ratio of a string is its
+power (or energy) divided by the mean of the strings of its inverter, and
+the imbalance index of an inverter is (max - min)/mean of the power (or
+energy) of its strings. A string that is shaded or soiled more than its
+siblings has a mismatch ratio below 1 and increases the imbalance index.
+
+Only the samples where the inverter produces (mean string current above
+min_current) are used. The daily and seasonal (DJF, MAM, JJA, SON) tables
+have, for every string, its energy and mismatch ratio and, for every
+inverter, the imbalance index of the energies and the mean imbalance index
+of the 5-minute powers. They are stored in 'resources/string_analytics/',
+e.g.
+
+    python string_analytics.py --start 2023-01-01
+"""
+
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import foulum_data
+
+results_path = 'resources/string_analytics/'
+
+systems = ['TBF', 'VBF']
+strings = ['{} PV{}'.format(system, i) for system in systems for i in range(1, 5)]
+
+# mean string current (A) above which an inverter is producing
+min_current = 0.5
+
+# tables, {name: pandas frequency of the periods}, seasons start in December
+tables = {'daily': 'D', 'seasonal': 'QS-DEC'}
+
+
+def columns():
+
+    """
+    Return the clean data columns of the strings
+    """
+
+    return ['{} input {}'.format(string, q) for string in strings
+            for q in ['current (A)', 'voltage (V)']]
+
+
+
+def string_power(data):
+
+    """
+    Return the power (kW) of every string, columns '<string> power (kW)'
+    """
+
+    current = data[['{} input current (A)'.format(s) for s in strings]].to_numpy(dtype=float)
+    voltage = data[['{} input voltage (V)'.format(s) for s in strings]].to_numpy(dtype=float)
+    return pd.DataFrame(0.001*current*voltage,
+                        index=data.index,
+                        columns=['{} power (kW)'.format(s) for s in strings])
+
+
+
+def _by_system(values):
+
+    """
+    Return the array values (timestamps x strings) as timestamps x systems x
+    strings of the system
+    """
+
+    return values.reshape(len(values), len(systems), -1)
+
+
+
+def mismatch(power):
+
+    """
+    Return the mismatch ratio of every string (power / mean power of the
+    strings of its inverter) and the imbalance index of every inverter
+    ((max - min)/mean power of its strings) for every timestamp of power,
+    NaN when the inverter does not produce
+    """
+
+    p = _by_system(power.to_numpy())
+    mean = p.mean(axis=2, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = p / mean
+        imbalance = (p.max(axis=2) - p.min(axis=2)) / mean[:, :, 0]
+    ratio = ratio.reshape(len(p), -1)
+    return (pd.DataFrame(ratio, index=power.index,
+                         columns=['{} mismatch ratio'.format(s) for s in strings]),
+            pd.DataFrame(imbalance, index=power.index,
+                         columns=['{} imbalance index'.format(s) for s in systems]))
+
+
+
+def producing(data):
+
+    """
+    Return True for the timestamps where the inverter of a system produces,
+    one column per system (mean current of its strings above min_current)
+    """
+
+    current = _by_system(data[['{} input current (A)'.format(s) for s in strings]].to_numpy(dtype=float))
+    return pd.DataFrame(current.mean(axis=2) > min_current, index=data.index, columns=systems)
+
+
+
+def analytics(data, freq):
+
+    """
+    Return the table of string analytics for periods of freq (e.g. 'D',
+    'QS-DEC'): '<string> energy (kWh)', '<string> mismatch ratio' (energy /
+    mean energy of the strings of the inverter), '<system> imbalance index'
+    (of the energies) and '<system> mean imbalance index' (mean of the
+    5-minute imbalance indices)
+    """
+
+    power = string_power(data)
+    active = producing(data).to_numpy()
+    # samples of an inverter are only used when it produces
+    mask = np.repeat(active, len(strings) // len(systems), axis=1)
+    power = power.where(mask)
+    ratio, imbalance = mismatch(power)
+
+    energy = (5/60)*power.resample(freq).sum(min_count=1)
+    energy.columns = ['{} energy (kWh)'.format(s) for s in strings]
+    energy_ratio, energy_imbalance = mismatch(energy)
+    mean_imbalance = imbalance.resample(freq).mean()
+    mean_imbalance.columns = ['{} mean imbalance index'.format(s) for s in systems]
+
+    return pd.concat([energy, energy_ratio, energy_imbalance, mean_imbalance], axis=1)
+
+
+
+def save(data, path=results_path):
+
+    """
+    Store the daily and seasonal tables of the string analytics of data as
+    'string_analytics_daily.parquet' and 'string_analytics_seasonal.parquet'
+    """
+
+    os.makedirs(path, exist_ok=True)
+    for name, freq in tables.items():
+        table = analytics(data, freq).astype('float32')
+        table.to_parquet(os.path.join(path, 'string_analytics_{}.parquet'.format(name)),
+                         compression='zstd')
+
+
+
+def load(name, columns=None, start=None, end=None, path=results_path):
+
+    """
+    Read the table name ('daily' or 'seasonal') for the periods starting
+    between start and end (both included, UTC if no time zone is given)
+    """
+
+    start = None if start is None else foulum_data._to_utc(start)
+    end = None if end is None else foulum_data._to_utc(end)
+    table = pd.read_parquet(os.path.join(path, 'string_analytics_{}.parquet'.format(name)),
+                            columns=columns)
+    return table.loc[start:end]
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Power, mismatch and imbalance of the strings')
+    parser.add_argument('--start', help='first day (UTC), default first day of the data')
+    parser.add_argument('--end', help='last day (UTC), default last day of the data')
+    parser.add_argument('--output', default=results_path)
+    args = parser.parse_args()
+
+    end = None if args.end is None else pd.Timestamp(args.end) + pd.Timedelta('23:55:00')
+    data = foulum_data.load(columns=columns(), start=args.start, end=end)
+    save(data, args.output)
+
+    seasonal = load('seasonal', path=args.output)
+    print(seasonal.filter(like='mismatch ratio').round(3).to_string())
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the correction rules of corrections.py on synthetic frames, and of
+the rule table clean_data.sensor_corrections against the inline fixes it
+replaced, e.g.
+
+    python -m pytest test_corrections.py
+"""
+
+import numpy as np
+import pandas as pd
+import corrections
+import clean_data
+
+
+def frame(start='2024-01-01 00:00', periods=12, columns=('a', 'b')):
+
+    """
+    Return a synthetic 5-minute frame, the values of column i at sample n are
+    100*i + n
+    """
+
+    index = pd.date_range(start=start, periods=periods, freq='5min', tz='UTC')
+    return pd.DataFrame({c: 100.0*i + np.arange(periods) for i, c in enumerate(columns)},
+                        index=index)
+
+
+
+def test_mask_window():
+
+    data = frame()
+    rule = {'action': 'mask', 'columns': ['a'],
+            'start': '2024-01-01 00:10', 'end': '2024-01-01 00:20'}
+    result = corrections.apply_corrections(data, [rule])
+    assert result['a'].isna().to_numpy().tolist() == [False]*2 + [True]*3 + [False]*7
+    pd.testing.assert_series_equal(result['b'], data['b'])
+    # the input is not modified
+    assert data['a'].notna().all()
+
+
+
+def test_mask_below_and_equal():
+
+    data = frame()
+    data.iloc[3, 0] = -100.0
+    data.iloc[5, 0] = -90.0
+    result = corrections.apply_corrections(data, [{'action': 'mask', 'columns': ['a'], 'below': -80.0},
+                                                  {'action': 'mask', 'columns': ['b'], 'equal': 104.0}])
+    assert result['a'].isna().to_numpy().nonzero()[0].tolist() == [3, 5]
+    assert result['b'].isna().to_numpy().nonzero()[0].tolist() == [4]
+
+
+
+def test_shift_direction():
+
+    # value(t) = value(t - value), '-2h' takes the value 2 hours later
+    data = frame(periods=48)
+    rule = {'action': 'shift', 'columns': ['a'], 'start': '2024-01-01 01:00', 'value': '-2h'}
+    result = corrections.apply_corrections(data, [rule])
+    assert result['a'].iloc[12] == data['a'].iloc[36]
+    assert result['a'].iloc[23] == data['a'].iloc[47]
+    # before start, and where the source timestamp is not in data, values
+    # are unchanged
+    pd.testing.assert_series_equal(result['a'].iloc[:12], data['a'].iloc[:12])
+    pd.testing.assert_series_equal(result['a'].iloc[24:], data['a'].iloc[24:])
+    pd.testing.assert_series_equal(result['b'], data['b'])
+
+
+
+def test_swap_after_start():
+
+    data = frame()
+    rule = {'action': 'swap', 'columns': [('a', 'b')], 'start': '2024-01-01 00:30'}
+    result = corrections.apply_corrections(data, [rule])
+    np.testing.assert_array_equal(result['a'].to_numpy()[:6], data['a'].to_numpy()[:6])
+    np.testing.assert_array_equal(result['a'].to_numpy()[6:], data['b'].to_numpy()[6:])
+    np.testing.assert_array_equal(result['b'].to_numpy()[6:], data['a'].to_numpy()[6:])
+
+
+
+def test_offset_above():
+
+    data = frame(columns=('wind',))
+    data['wind'] = [350.0, 10.0, 170.0, 190.0] * 3
+    rules = [{'action': 'offset', 'columns': ['wind'], 'end': '2024-01-01 00:25', 'value': 180},
+             {'action': 'offset', 'columns': ['wind'], 'above': 360, 'value': -360}]
+    result = corrections.apply_corrections(data, rules)
+    # 6 samples rotated, the values above 360 wrapped
+    assert result['wind'].tolist() == [170.0, 190.0, 350.0, 10.0, 170.0, 190.0]*2
+
+
+
+def test_clip_and_unknown_action():
+
+    data = frame()
+    result = corrections.apply_corrections(data, [{'action': 'clip', 'columns': ['a'], 'value': (2, 5)}])
+    assert result['a'].min() == 2 and result['a'].max() == 5
+    try:
+        corrections.apply_corrections(data, [{'action': 'scale', 'columns': ['a']}])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('unknown action accepted')
+
+
+
+def inline_fixes(data):
+
+    """
+    The fixes of the 2023 incidents as they were written inline in
+    stage_weather_station() and stage_wind() of clean_data.py, with end_date
+    the last timestamp of data
+    """
+
+    data = data.copy()
+    tz = 'UTC'
+    end_date = str(data.index[-1].tz_localize(None))
+    dic_columns = clean_data.weather_station_columns
+
+    time_index_tbc = pd.date_range(start='2023-05-18 00:00:00', end='2023-05-19 00:00:00', freq='5min', tz=tz)
+    data.loc[time_index_tbc, 'Reference Cell Tilted facing up (W.m-2)'] = np.nan
+    time_index_tbc = pd.date_range(start='2023-06-15 00:00:00', end='2023-09-06 00:00:00', freq='5min', tz=tz)
+    data.loc[time_index_tbc, 'Reference Cell Tilted facing up (W.m-2)'] = np.nan
+
+    time_index_tbc = pd.date_range(start='2023-08-14 00:00:00', end='2023-09-07 00:00:00', freq='5min', tz=tz)
+    data.loc[time_index_tbc, 'Reference Cell Vertical East (W.m-2)'] = np.nan
+    data.loc[time_index_tbc, 'Reference Cell Vertical West (W.m-2)'] = np.nan
+
+    time_index_tbc = pd.date_range(start='2023-09-07 00:00:00', end=end_date, freq='5min', tz=tz)
+    save_a = data.loc[time_index_tbc, 'Reference Cell Tilted facing up (W.m-2)'].copy()
+    save_b = data.loc[time_index_tbc, 'Reference Cell Tilted facing down (W.m-2)'].copy()
+    data.loc[time_index_tbc, 'Reference Cell Tilted facing up (W.m-2)'] = data.loc[time_index_tbc, 'Reference Cell Vertical East (W.m-2)']
+    data.loc[time_index_tbc, 'Reference Cell Tilted facing down (W.m-2)'] = data.loc[time_index_tbc, 'Reference Cell Vertical West (W.m-2)']
+    data.loc[time_index_tbc, 'Reference Cell Vertical East (W.m-2)'] = save_a
+    data.loc[time_index_tbc, 'Reference Cell Vertical West (W.m-2)'] = save_b
+
+    time_index_tbc = pd.date_range(start='2023-07-04 00:00:00', end=end_date[:-8]+'21:55:00', freq='5min', tz=tz)
+    data.loc[time_index_tbc, list(dic_columns)] = data.loc[time_index_tbc + pd.DateOffset(hours=2), list(dic_columns)].values
+
+    temperature = data['Ambient Temperature (Deg C)']
+    data.loc[temperature < -80.0, 'Ambient Temperature (Deg C)'] = None
+    humidity = data['Relative Humidity (%)']
+    data.loc[humidity == -100.0, 'Relative Humidity (%)'] = None
+
+    time_index_tbc = pd.date_range(start=str(data.index[0].tz_localize(None)), end='2023-09-07 00:00:00', freq='5min', tz=tz)
+    data.loc[time_index_tbc, 'wind direction (deg)'] += 180
+    wind = data['wind direction (deg)']
+    data.loc[wind > 360, 'wind direction (deg)'] -= 360
+    return data
+
+
+
+def test_sensor_corrections_match_inline_fixes():
+
+    index = pd.date_range(start='2023-05-01 00:00', end='2023-09-30 23:55', freq='5min', tz='UTC')
+    rng = np.random.default_rng(0)
+    columns = list(clean_data.weather_station_columns) + ['wind direction (deg)', 'other (W)']
+    data = pd.DataFrame(rng.uniform(0, 360, (len(index), len(columns))), index=index, columns=columns)
+    # sentinels of the temperature and humidity sensors
+    data.iloc[rng.integers(0, len(index), 50), columns.index('Ambient Temperature (Deg C)')] = -99.0
+    data.iloc[rng.integers(0, len(index), 50), columns.index('Relative Humidity (%)')] = -100.0
+
+    expected = inline_fixes(data)
+    result = corrections.apply_corrections(data, clean_data.sensor_corrections)
+    pd.testing.assert_frame_equal(result, expected)
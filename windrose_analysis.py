@@ -10,6 +10,7 @@ and it was rotated around 180 degrees.
 from windrose import WindroseAxes
 from matplotlib import pyplot as plt
 import pandas as pd
+import foulum_data
 
 #read clean data
 start_date = '2023-01-30 00:00:00'
@@ -34,10 +35,15 @@ time_index_aft = pd.date_range(start=start_date_aft,
                            freq='5min',
                            tz=tz)
 
-data=pd.read_csv('resources/clean_data.csv',
-                 index_col=0)
-
-data.index = pd.to_datetime(data.index, utc=True) 
+columns = ['wind velocity (m.s-1)',
+           'wind direction (deg)',
+           'wind velocity_2nd station 2m height (m.s-1)',
+           'wind direction_2nd station 2m height (deg)',
+           'wind velocity_2nd station 10m height (m.s-1)',
+           'wind direction_2nd station 10m height (deg)']
+data = foulum_data.load(columns=columns,
+                        start=start_date, 
+                        end=end_date)
 
 ws_bef=data['wind velocity (m.s-1)'][time_index_bef]
 wd_bef= data['wind direction (deg)'][time_index_bef] #+180 already added when cleaning data
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+
+"""
+Run annual yield simulations of bifacial PV layouts in a pool of processes.
+
+Every job is a dictionary with the layout parameters 'tilt', 'orientation',
+'pvrow_height', 'pvrow_width', 'gcr', 'albedo' and 'bifaciality'. All the
+jobs share the weather data, the solar position, the PV module and the
+temperature model, and the results are returned in the order of the jobs.
+
+Jobs can be generated from a grid or a Latin hypercube sample over some of
+the parameters, the others keep the values of the vertical installation in
+Foulum. sweep() appends every result to a CSV file as soon as it is
+calculated, so an interrupted sweep resumes where it stopped, and returns a
+tidy table with one row per job, e.g.
+
+    python yield_sweep.py --grid gcr=0.15,0.25,0.35 tilt=25,90 --workers 8
+    python yield_sweep.py --lhs gcr=0.1:0.6 pvrow_height=1:3 albedo=0.1:0.4
+                          --samples 2000 --lat 55.7 --lon 12.5 --workers 8
+                          --output resources/sweeps/copenhagen.csv
+
+Large sweeps can screen the layouts with the fast infinite sheds irradiance
+model and confirm the best ones with pvfactors, e.g.
+
+    python yield_sweep.py --lhs gcr=0.1:0.6 tilt=20:90 --samples 5000
+                          --backend infinite_sheds --confirm 50
+"""
+
+import argparse
+import csv
+import functools
+import hashlib
+import itertools
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import pvlib
+from bifacial_irradiance import calculate_irradiance_bifacial, sapm_daytime
+import pvgis_tmy
+
+# parameters of every job, in the order of the columns of the results table
+parameters = ['tilt', 'orientation', 'pvrow_height', 'pvrow_width', 'gcr',
+              'albedo', 'bifaciality']
+
+results_path = 'resources/sweeps/'
+
+
+def annual_yield(job, weather, solar_position, module, temperature_model_parameters,
+                 backend='pvfactors'):
+
+    """
+    Return the DC energy (Wh) produced by one PV module of the layout job.
+    weather includes 'dni', 'dhi', 'temp_air' and 'wind_speed' and
+    solar_position 'azimuth' and 'apparent_zenith'. backend is the
+    irradiance model, 'pvfactors' or 'infinite_sheds'.
+    """
+
+    effective_irrad_bifi = calculate_irradiance_bifacial(job['tilt'],
+                                                         job['orientation'],
+                                                         job['bifaciality'],
+                                                         weather.index,
+                                                         weather['dni'],
+                                                         weather['dhi'],
+                                                         solar_position['azimuth'],
+                                                         solar_position['apparent_zenith'],
+                                                         job['pvrow_height'],
+                                                         job['pvrow_width'],
+                                                         job['albedo'],
+                                                         job['gcr'],
+                                                         backend=backend)
+
+    cell_temperature = pvlib.temperature.sapm_cell(effective_irrad_bifi,
+                                                   weather['temp_air'],
+                                                   weather['wind_speed'],
+                                                   **temperature_model_parameters,)
+
+    dc_power = sapm_daytime(effective_irrad_bifi,
+                            cell_temperature,
+                            module,
+                            solar_position['apparent_zenith'])
+    return dc_power['p_mp'].sum()
+
+
+
+def simulations(jobs, weather, solar_position, module, temperature_model_parameters,
+                backend='pvfactors', workers=1):
+
+    """
+    Yield the annual yield of every job in order, calculated in a pool of
+    processes if workers > 1
+    """
+
+    simulate = functools.partial(annual_yield,
+                                 weather=weather,
+                                 solar_position=solar_position,
+                                 module=module,
+                                 temperature_model_parameters=temperature_model_parameters,
+                                 backend=backend)
+    if workers > 1:
+        # a few jobs per task, the inputs shared by all jobs are sent with
+        # every task, and results are yielded as soon as their task is done
+        chunksize = max(1, min(16, math.ceil(len(jobs) / (4*workers))))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from executor.map(simulate, jobs, chunksize=chunksize)
+    else:
+        for job in jobs:
+            yield simulate(job)
+
+
+
+def run(jobs, weather, solar_position, module, temperature_model_parameters,
+        backend='pvfactors', workers=1):
+
+    """
+    Return the annual yield of every job, calculated in a pool of processes
+    if workers > 1
+    """
+
+    return list(simulations(jobs, weather, solar_position, module,
+                            temperature_model_parameters, backend=backend,
+                            workers=workers))
+
+
+
+def sweep(jobs, weather, solar_position, module, temperature_model_parameters,
+          fn, backend='pvfactors', workers=1):
+
+    """
+    Run the jobs that are not in the results file fn yet, appending every
+    result to fn as soon as it is calculated. Returns the tidy results
+    table of all jobs: job id, parameters, irradiance backend, 'dc energy
+    (Wh)' of one module and 'specific yield (kWh/kWp)'.
+
+    Job ids include the backend and a hash of the weather data and the
+    module, so results for another site or module in the same file are
+    never reused.
+    """
+
+    inputs_key = backend + inputs_hash(weather, solar_position, module)
+    ids = [job_id(job, inputs_key) for job in jobs]
+    exists = os.path.exists(fn)
+    done = set(pd.read_csv(fn, usecols=['job'])['job']) if exists else set()
+    pending = [(i, job) for i, job in zip(ids, jobs) if i not in done]
+    pending = list(dict(pending).items())  # same job only once
+
+    os.makedirs(os.path.dirname(fn) or '.', exist_ok=True)
+    with open(fn, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if not exists:
+            writer.writerow(['job'] + parameters + ['backend', 'dc energy (Wh)'])
+        results = simulations([job for i, job in pending], weather, solar_position,
+                              module, temperature_model_parameters,
+                              backend=backend, workers=workers)
+        for (i, job), energy in zip(pending, results):
+            writer.writerow([i] + [job[p] for p in parameters] + [backend, energy])
+            f.flush()
+
+    results = pd.read_csv(fn).drop_duplicates('job', keep='last').set_index('job')
+    results = results.loc[ids].reset_index()
+    results['specific yield (kWh/kWp)'] = (results['dc energy (Wh)']
+                                           / (module['Impo']*module['Vmpo']))
+    return results
+
+
+
+def grid(values, fixed):
+
+    """
+    Return one job per combination of values = {parameter: list of values},
+    the other parameters take the values in fixed
+    """
+
+    names = list(values)
+    return [dict(fixed, **dict(zip(names, combination)))
+            for combination in itertools.product(*values.values())]
+
+
+
+def latin_hypercube(ranges, samples, fixed, seed=None):
+
+    """
+    Return samples jobs from a Latin hypercube over ranges = {parameter:
+    (min, max)}: every range is split in samples intervals and every interval
+    is sampled once. The other parameters take the values in fixed.
+    """
+
+    rng = np.random.default_rng(seed)
+    values = {}
+    for name, (low, high) in ranges.items():
+        u = (rng.permutation(samples) + rng.random(samples)) / samples
+        values[name] = low + u*(high - low)
+    return [dict(fixed, **{name: float(values[name][i]) for name in ranges})
+            for i in range(samples)]
+
+
+
+def job_id(job, inputs_key=''):
+
+    """
+    Return an id for the parameters of job and the simulation inputs
+    """
+
+    text = json.dumps([inputs_key] + [float(job[p]) for p in parameters])
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+
+def inputs_hash(weather, solar_position, module):
+
+    """
+    Return a hash of the weather data, the solar position and the module
+    """
+
+    h = hashlib.sha256()
+    for data in [weather, solar_position, module.astype(str)]:
+        h.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+
+def parse_values(specifications, ranges=False):
+
+    """
+    Parse 'name=v1,v2,...' (or 'name=min:max' if ranges) command line
+    specifications into {name: values}
+    """
+
+    values = {}
+    for specification in specifications:
+        name, text = specification.split('=')
+        if name not in parameters:
+            raise ValueError('unknown parameter {}, use one of {}'.format(name, parameters))
+        if ranges:
+            values[name] = tuple(float(v) for v in text.split(':'))
+        else:
+            values[name] = [float(v) for v in text.split(',')]
+    return values
+
+
+
+if __name__ == '__main__':
+
+    # module, temperature model and vertical layout of the pilot plant
+    import estimate_annual_yield as foulum
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--grid', nargs='+', default=[],
+                        help='parameter values, name=v1,v2,...')
+    parser.add_argument('--lhs', nargs='+', default=[],
+                        help='parameter ranges of a Latin hypercube, name=min:max')
+    parser.add_argument('--samples', type=int, default=100,
+                        help='number of Latin hypercube samples')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the Latin hypercube sample')
+    parser.add_argument('--lat', type=float, default=foulum.lat)
+    parser.add_argument('--lon', type=float, default=foulum.lon)
+    parser.add_argument('--backend', default='pvfactors',
+                        choices=['pvfactors', 'infinite_sheds'],
+                        help='irradiance model of the sweep')
+    parser.add_argument('--confirm', type=int, default=0,
+                        help='number of best layouts calculated again with pvfactors')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes running the simulations')
+    parser.add_argument('--output', default=os.path.join(results_path, 'sweep.csv'),
+                        help='results file, an interrupted sweep resumes from it')
+    args = parser.parse_args()
+
+    fixed = dict(foulum.layouts['vertical'], gcr=foulum.gcr_v,
+                 albedo=foulum.albedo, bifaciality=foulum.bifaciality)
+    if args.lhs:
+        jobs = latin_hypercube(parse_values(args.lhs, ranges=True), args.samples,
+                               fixed, seed=args.seed)
+    else:
+        jobs = grid(parse_values(args.grid), fixed)
+
+    tmy = pvgis_tmy.get_tmy(args.lat, args.lon)
+    location = pvlib.location.Location(args.lat, args.lon, tz='UTC')
+    solar_position = location.get_solarposition(times=tmy.index)
+
+    results = sweep(jobs,
+                    tmy[['dni', 'dhi', 'temp_air', 'wind_speed']],
+                    solar_position[['azimuth', 'apparent_zenith']],
+                    foulum.module,
+                    foulum.temperature_model_parameters,
+                    args.output,
+                    backend=args.backend,
+                    workers=args.workers)
+    print(results.drop(columns='job').describe())
+
+    if args.confirm > 0:
+        best = results.nlargest(args.confirm, 'specific yield (kWh/kWp)')
+        confirmed = sweep(best[parameters].to_dict('records'),
+                          tmy[['dni', 'dhi', 'temp_air', 'wind_speed']],
+                          solar_position[['azimuth', 'apparent_zenith']],
+                          foulum.module,
+                          foulum.temperature_model_parameters,
+                          args.output,
+                          backend='pvfactors',
+                          workers=args.workers)
+        confirmed['screening yield (kWh/kWp)'] = best['specific yield (kWh/kWp)'].to_numpy()
+        print(confirmed.drop(columns=['job', 'backend']).to_string())